@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    cost of the cacheable lookup paths on a catalogue response: miss (replayed request
+    and store), MEMCACHE hit (a copy, and shared), db hit (MEMCACHE cleared, SimpleCache
+    stand-in) and stale hit
+    usage: python benchmarks/bench_cache.py [-n ITEMS] [-r REPEAT] [-l LATENCY]
+'''
+from __future__ import print_function
+import time
+import argparse
+
+import benchutils
+from phate89lib import kodiutils, replay
+from phate89lib.cacheutils import MEMCACHE
+from phate89lib.rutils import RUtils
+
+
+class Catalogue(RUtils):
+    LOGLEVEL = 0
+
+    def __init__(self):
+        RUtils.__init__(self)
+        self.cache = benchutils.ReprCache()
+        self.ignore_cache = False
+
+    @kodiutils.cacheable(hours=1)
+    def getShows(self):
+        return self.getJson(benchutils.API + '/shows')['data']['shows']
+
+    @kodiutils.cacheable(hours=1, shared=True)
+    def getSharedShows(self):
+        return self.getJson(benchutils.API + '/shows')['data']['shows']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--items', type=int, default=2000)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-l', '--latency', type=float, default=0, help='seconds added to every response')
+    args = parser.parse_args()
+    fixtures = benchutils.makeFixtures(args.items)
+    catalogue = Catalogue()
+    replay.install(catalogue.SESSION, fixtures, 'replay', latency=args.latency)
+
+    def miss():
+        MEMCACHE.clear()
+        catalogue.cache.data.clear()
+        catalogue.getShows()
+
+    def hit():
+        catalogue.getShows()
+
+    def sharedHit():
+        catalogue.getSharedShows()
+
+    def dbHit():
+        MEMCACHE.clear()
+        catalogue.getShows()
+
+    def expire():
+        while kodiutils._INFLIGHT:
+            # background refresh of the previous run
+            time.sleep(0.01)
+        MEMCACHE.clear()
+        codec = kodiutils.getCacheCodec()
+        for key, (raw, expires) in list(catalogue.cache.data.items()):
+            entry = codec.decode(eval(raw))
+            if isinstance(entry, dict) and kodiutils.CACHEMARKER in entry:
+                entry['expires'] = time.time() - 1
+                catalogue.cache.data[key] = (repr(codec.encode(key, entry, expires)), expires)
+
+    catalogue.getShows()
+    stored = sum(len(raw) for raw, _ in catalogue.cache.data.values())
+    catalogue.getSharedShows()
+    print('%d items, %d bytes stored, best of %d' % (args.items, stored, args.repeat))
+    for label, func, number, setup in (('miss', miss, 1, 'pass'), ('MEMCACHE hit', hit, 1000, 'pass'),
+                                       ('shared hit', sharedHit, 1000, 'pass'),
+                                       ('db hit', dbHit, 1, 'pass'), ('stale hit', hit, 1, expire)):
+        elapsed = benchutils.best(func, args.repeat, number, setup)
+        print('%-16s %10.1f us' % (label, elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
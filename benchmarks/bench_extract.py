@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    getFileExtracted throughput on replayed subtitle archives (srt, gz, zip and 7z when
+    py7zr is installed), bandwidth simulates the download speed
+    usage: python benchmarks/bench_extract.py [-s SUBS] [-r REPEAT] [-b BYTES_PER_SECOND]
+'''
+from __future__ import print_function
+import io
+import os
+import gzip
+import shutil
+import zipfile
+import argparse
+import tempfile
+
+import benchutils
+from phate89lib import replay
+from phate89lib.rutils import RUtils
+
+
+def makeSrt(lines):
+    return u''.join(u'%d\n00:00:%02d,000 --> 00:00:%02d,500\nRiga numero %d del sottotitolo\n\n' %
+                    (i, i % 60, i % 60, i) for i in range(1, lines + 1)).encode('utf-8')
+
+
+def makeArchives(subs, lines):
+    srt = makeSrt(lines)
+    archives = {'srt': srt}
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as fd:
+        fd.write(srt)
+    archives['gz'] = buf.getvalue()
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as fd:
+        for i in range(subs):
+            fd.writestr('Show.S01E%02d.720p.srt' % (i + 1), srt)
+    archives['zip'] = buf.getvalue()
+    try:
+        import py7zr
+    except ImportError:
+        return archives
+    folder = tempfile.mkdtemp()
+    try:
+        name = os.path.join(folder, 'subs.7z')
+        with py7zr.SevenZipFile(name, 'w') as fd:
+            for i in range(subs):
+                fd.writestr(srt, 'Show.S01E%02d.720p.srt' % (i + 1))
+        with open(name, 'rb') as fd:
+            archives['7z'] = fd.read()
+    finally:
+        shutil.rmtree(folder)
+    return archives
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--subs', type=int, default=20, help='subtitles in every archive')
+    parser.add_argument('-n', '--lines', type=int, default=800, help='lines of every subtitle')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-b', '--bandwidth', type=int, default=0, help='bytes per second, 0 unlimited')
+    args = parser.parse_args()
+    fixtures = tempfile.mkdtemp(prefix='phate89bench')
+    dataPath = os.path.join(fixtures, 'extracted')
+    archives = makeArchives(args.subs, args.lines)
+    for ext, body in archives.items():
+        replay.addFixture(fixtures, 'GET', '%s/subs/%s' % (benchutils.API, ext), body)
+    rutils = RUtils()
+    rutils.LOGLEVEL = 0
+    replay.install(rutils.SESSION, fixtures, 'replay', bandwidth=args.bandwidth)
+
+    print('%d subtitles of %d lines, best of %d' % (args.subs, args.lines, args.repeat))
+    print('%-6s %10s %10s %10s' % ('type', 'bytes', 'ms', 'MB/s'))
+    try:
+        for ext in sorted(archives):
+            url = '%s/subs/%s' % (benchutils.API, ext)
+            result = rutils.getFileExtracted(url, dataPath=dataPath, index=args.subs // 2)
+            if not result:
+                print('%-6s extraction failed' % ext)
+                continue
+            elapsed = benchutils.best(lambda: rutils.getFileExtracted(url, dataPath=dataPath, index=args.subs // 2),
+                                      args.repeat)
+            size = len(archives[ext])
+            print('%-6s %10d %10.2f %10.2f' % (ext, size, elapsed * 1000, size / elapsed / 1e6))
+    finally:
+        shutil.rmtree(fixtures)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    cold start cost of the phate89lib modules
+    every module is imported in a fresh interpreter, like kodi does on every plugin invocation
+    usage: python benchmarks/bench_import.py [-n RUNS] [-p EXTRA_SYS_PATH ...]
+    outside kodi give with -p a folder with the kodi_six module (and the other addon modules),
+    -p benchmarks uses the kodi_six stand-in of this folder
+'''
+from __future__ import print_function
+import os
+import sys
+import argparse
+import subprocess
+
+LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib')
+MODULES = ('phate89lib.staticutils', 'phate89lib.kodiutils', 'phate89lib.rutils')
+SCRIPT = 'import time; t = time.time(); import %s; print(time.time() - t)'
+
+
+def measure(module, runs, paths):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([LIB] + paths + [env.get('PYTHONPATH', '')])
+    times = []
+    for _ in range(runs):
+        proc = subprocess.Popen([sys.executable, '-c', SCRIPT % module], env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        if proc.returncode:
+            return None, err.decode('utf-8', 'replace').strip().splitlines()[-1]
+        times.append(float(out.decode('utf-8').strip()))
+    times.sort()
+    return times, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('-p', '--path', action='append', default=[])
+    args = parser.parse_args()
+    print('%-26s %10s %10s %10s' % ('module', 'min ms', 'median ms', 'max ms'))
+    for module in MODULES:
+        times, error = measure(module, args.runs, args.path)
+        if error:
+            print('%-26s failed: %s' % (module, error))
+            continue
+        print('%-26s %10.2f %10.2f %10.2f' % (module, times[0] * 1000, times[len(times) // 2] * 1000,
+                                              times[-1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
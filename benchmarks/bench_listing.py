@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    time to build a directory listing outside kodi (kodi_six stand-in of this folder)
+    from the replayed catalogue api to the items given to xbmcplugin
+    usage: python benchmarks/bench_listing.py [-n ITEMS] [-r REPEAT] [-l LATENCY]
+'''
+from __future__ import print_function
+import argparse
+
+import benchutils
+from kodi_six import xbmcplugin
+from phate89lib import kodiutils, replay
+from phate89lib.rutils import RUtils
+
+
+def addShows(shows):
+    for show in shows:
+        kodiutils.addListItem(show['title'], {'mode': 'show', 'id': show['id']}, thumb=show['thumb'],
+                              fanart=show['fanart'], videoInfo={'plot': show['plot'], 'year': show['year'],
+                                                                'genre': show['genre']})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--items', type=int, default=2000)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-l', '--latency', type=float, default=0, help='seconds added to every response')
+    args = parser.parse_args()
+    fixtures = benchutils.makeFixtures(args.items)
+    rutils = RUtils()
+    rutils.LOGLEVEL = 0
+    replay.install(rutils.SESSION, fixtures, 'replay', latency=args.latency)
+    shows = rutils.getJson(benchutils.API + '/shows')['data']['shows']
+
+    def single():
+        xbmcplugin.reset()
+        addShows(shows)
+
+    def batched():
+        xbmcplugin.reset()
+        kodiutils.startDirectory(len(shows))
+        addShows(shows)
+        kodiutils.flushDirectory()
+
+    def fetchJson():
+        rutils.getJson(benchutils.API + '/shows')
+
+    def fetchSoup():
+        rutils.getSoup(benchutils.API + '/shows.html', parser='auto', strainer={'name': 'div', 'class_': 'show'})
+
+    def endToEnd():
+        xbmcplugin.reset()
+        kodiutils.startDirectory()
+        addShows(rutils.getJson(benchutils.API + '/shows')['data']['shows'])
+        kodiutils.flushDirectory()
+
+    print('%d items, best of %d' % (len(shows), args.repeat))
+    for label, func in (('getJson', fetchJson), ('getSoup (auto, strainer)', fetchSoup),
+                        ('addListItem', single), ('startDirectory + addListItem', batched),
+                        ('getJson + directory', endToEnd)):
+        elapsed = benchutils.best(func, args.repeat)
+        print('%-32s %8.2f ms  %6.2f us/item' % (label, elapsed * 1000, elapsed * 1e6 / len(shows)))
+
+
+if __name__ == '__main__':
+    main()
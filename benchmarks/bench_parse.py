@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    parseFileName/guessQuality over a library scan like corpus of release names
+    compares the table driven parser with the previous implementation
+    usage: python benchmarks/bench_parse.py [-n NAMES] [-r REPEAT]
+'''
+from __future__ import print_function
+import os
+import re
+import sys
+import timeit
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+from phate89lib import staticutils  # noqa: E402
+
+SHOWS = ('The Big Bang Theory', 'Doctor Who', 'Game of Thrones', 'Il Commissario Montalbano', 'Lost',
+         'Breaking Bad', 'The Office US', 'Gomorra La Serie', 'Stranger Things', 'Better Call Saul')
+FORMATS = ('{show}.S{season:02d}E{episode:02d}.{quality}.{group}.mkv',
+           '{show} - {season}x{episode:02d} - {quality}-{group}.avi',
+           '{show}_s{season}e{episode}_{quality}.mp4',
+           '{show}.Ep.{episode}.{quality}-{group}[rarbg].mkv',
+           '{show} {season}x{episode:02d}.srt')
+QUALITIES = ('720p.HDTV.x264', '1080p.WEB-DL.DD5.1.H.264', 'HDTV.XviD', 'BDRip.x264', '1080p.BluRay.x264',
+             'WEBRip.x264', '1080i.HDTV', 'HR.HDTV.AC3')
+GROUPS = ('CTU', 'LOL', 'DIMENSION', 'KILLERS', 'NTb', 'ASAP', 'DEMAND', 'SVA')
+
+
+def legacy_guessQuality(sFileName):
+    fl = sFileName.lower()
+    res = ""
+    if ('web-dl' in fl) or ('web.dl' in fl) or ('webdl' in fl) or ('web dl' in fl):
+        res = "web-dl"
+    if ('720p' in fl) and ('hdtv' in fl):
+        res = "720p"
+    if ('bdrip' in fl):
+        res = "bdrip"
+    if ('bdrip' in fl):
+        res = "bdrip"
+    if ('bluray' in fl):
+        res = "bluray"
+    if ('1080i' in fl):
+        res = "1080i"
+    if ('1080p' in fl):
+        res = "1080p"
+    if ('hdtv' in fl):
+        res = "normale"
+    if ('hr' in fl):
+        res = "hr"
+    return res
+
+
+def legacy_parseFileName(filename):
+    tvshow = episode = season = ''
+    reStrings = [
+        (r'(?P<NOME>.*[^ _.-])[ _.-]+s(?P<STAGIONE>[0-9]+)[ ._-]*'
+         r'e(?P<EPISODIO>[0-9]+(?:(?:[a-i]|\.[1-9])(?![0-9]))?)'),
+        (r'(?P<NOME>.*[^ _.-])[ _.-]+(?P<STAGIONE>[0-9]+)x'
+         r'(?P<EPISODIO>[0-9]+(?:(?:[a-i]|\.[1-9])(?![0-9]))?)'),
+        (r'(?P<NOME>.*[^ _.-])[ _.-]+e(?:p[ ._-]?)?'
+         r'(?P<EPISODIO>[0-9]+(?:(?:[a-i]|\.[1-9])(?![0-9]))?)')
+    ]
+    for rg in reStrings:
+        p = re.search(rg, filename, re.IGNORECASE)
+        if p:
+            break
+    if p:
+        tvshow = p.group('NOME').replace(".", " ").replace(
+            "_", " ").replace("-", " ").replace("  ", " ").strip()
+        episode = int(p.group('EPISODIO'))
+        if len(p.groups()) > 2:
+            season = int(p.group('STAGIONE'))
+        else:
+            season = 1
+    return tvshow, season, episode
+
+
+def makeCorpus(size, seed=89):
+    rnd = random.Random(seed)
+    names = []
+    for _ in range(size):
+        show = rnd.choice(SHOWS)
+        names.append(rnd.choice(FORMATS).format(
+            show=show.replace(' ', rnd.choice('. _')), season=rnd.randint(1, 12), episode=rnd.randint(1, 24),
+            quality=rnd.choice(QUALITIES), group=rnd.choice(GROUPS)))
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--names', type=int, default=5000)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+    corpus = makeCorpus(args.names)
+
+    def legacy():
+        for name in corpus:
+            legacy_parseFileName(name)
+            legacy_guessQuality(name)
+
+    def single():
+        for name in corpus:
+            staticutils.parse_name(name)
+
+    def batch():
+        staticutils._PARSECACHE.clear()
+        staticutils.parse_many(corpus)
+
+    def batchWarm():
+        staticutils.parse_many(corpus)
+
+    print('%d names, best of %d' % (len(corpus), args.repeat))
+    for label, func in (('legacy parseFileName+guessQuality', legacy), ('parse_name', single),
+                        ('parse_many (cold)', batch), ('parse_many (memoized)', batchWarm)):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('%-36s %8.2f ms  %6.2f us/name' % (label, best * 1000, best * 1e6 / len(corpus)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+'''
+    shared setup of the benchmarks: lib and the kodi_six stand-in in sys.path,
+    a SimpleCache stand-in and the replay fixtures of a fake catalogue api
+'''
+import os
+import sys
+import json
+import time
+import timeit
+import datetime
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lib'))
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+API = 'http://api.benchmark.test'
+
+
+class ReprCache(object):
+    '''
+        SimpleCache stand-in: like SimpleCache it keeps repr(value) and evals it back,
+        in memory instead of sqlite
+    '''
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, endpoint, checksum=''):
+        item = self.data.get(endpoint)
+        if item is None or item[1] < time.time():
+            return None
+        return eval(item[0])
+
+    def set(self, endpoint, data, checksum='', expiration=datetime.timedelta(days=30)):
+        self.data[endpoint] = (repr(data), time.time() + expiration.total_seconds())
+
+
+def best(func, repeat, number=1, setup='pass'):
+    '''best time of a call of func in seconds, setup runs before every repeat'''
+    return min(timeit.repeat(func, setup=setup, number=number, repeat=repeat)) / number
+
+
+def makeCatalogue(items):
+    return {'data': {'shows': [{
+        'id': i,
+        'title': u'Show number %d' % i,
+        'plot': u'Plot of the show number %d, with some text to make it realistic. ' % i * 4,
+        'thumb': '%s/img/%d/thumb.jpg' % (API, i),
+        'fanart': '%s/img/%d/fanart.jpg' % (API, i),
+        'year': 1990 + i % 30,
+        'genre': ['drama', 'crime'][i % 2],
+    } for i in range(items)]}}
+
+
+def makeFixtures(items, path=None):
+    '''writes the catalogue fixtures (json and html), returns their folder'''
+    from phate89lib import replay
+    path = path or tempfile.mkdtemp(prefix='phate89bench')
+    catalogue = makeCatalogue(items)
+    replay.addFixture(path, 'GET', API + '/shows', json.dumps(catalogue).encode('utf-8'),
+                      headers={'Content-Type': 'application/json; charset=utf-8'})
+    html = u''.join(u'<div class="show"><a href="/show/%(id)d">%(title)s</a><p>%(plot)s</p></div>' % show
+                    for show in catalogue['data']['shows'])
+    replay.addFixture(path, 'GET', API + '/shows.html',
+                      (u'<html><body>%s</body></html>' % html).encode('utf-8'),
+                      headers={'Content-Type': 'text/html; charset=utf-8'})
+    return path
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+'''
+    headless stand-in of kodi_six for the benchmarks: enough of the kodi api for
+    phate89lib.kodiutils to load and build listings outside kodi, nothing is displayed
+    python benchmarks/bench_x.py puts the benchmarks folder (and so this package) in sys.path
+'''
+from . import utils, xbmc, xbmcaddon, xbmcgui, xbmcplugin  # noqa: F401
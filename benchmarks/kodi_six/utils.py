@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+import sys
+
+PY2 = sys.version_info[0] == 2
+
+
+def py2_encode(s, encoding='utf-8', errors='strict'):
+    if PY2 and isinstance(s, unicode):  # noqa: F821
+        return s.encode(encoding, errors)
+    return s
+
+
+def py2_decode(s, encoding='utf-8', errors='strict'):
+    if PY2 and isinstance(s, str):
+        return s.decode(encoding, errors)
+    return s
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import json
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+ISO_639_1 = 0
+ISO_639_2 = 1
+ENGLISH_NAME = 2
+
+# messages given to log, builtins given to executebuiltin
+LOG = []
+BUILTINS = []
+# JSON-RPC method -> result (or function of the params returning it)
+JSONRPC = {}
+
+
+def log(msg, level=LOGDEBUG):
+    LOG.append((level, msg))
+
+
+def executebuiltin(function, wait=False):
+    BUILTINS.append(function)
+
+
+def _answer(request):
+    result = JSONRPC.get(request.get('method'), 'OK')
+    if callable(result):
+        result = result(request.get('params', {}))
+    return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+
+
+def executeJSONRPC(jsonrpccommand):
+    request = json.loads(jsonrpccommand)
+    if isinstance(request, list):
+        return json.dumps([_answer(item) for item in request])
+    return json.dumps(_answer(request))
+
+
+def translatePath(path):
+    return path
+
+
+def getLocalizedString(id):
+    return str(id)
+
+
+def getInfoLabel(cLine):
+    return ''
+
+
+def getRegion(id):
+    return {'datelong': '%A, %d %B %Y', 'dateshort': '%d/%m/%Y'}.get(id, '')
+
+
+def convertLanguage(language, format):
+    return language
+
+
+class Keyboard(object):
+
+    def __init__(self, line='', heading='', hidden=False):
+        self.text = line
+
+    def setHiddenInput(self, hidden):
+        pass
+
+    def doModal(self, autoclose=0):
+        pass
+
+    def isConfirmed(self):
+        return False
+
+    def getText(self):
+        return self.text
+
+
+class Player(object):
+
+    def isPlayingVideo(self):
+        return False
+
+    def getPlayingFile(self):
+        return ''
+
+
+class Monitor(object):
+
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        return True
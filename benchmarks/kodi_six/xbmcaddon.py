@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+# addon info and settings of the fake addon
+INFO = {
+    'id': 'plugin.video.benchmark',
+    'name': 'Benchmark',
+    'version': '1.0.0',
+    'path': os.path.join(tempfile.gettempdir(), 'phate89bench', 'addon'),
+    'profile': os.path.join(tempfile.gettempdir(), 'phate89bench', 'profile'),
+}
+SETTINGS = {}
+
+
+class Addon(object):
+
+    def __init__(self, id=None):
+        pass
+
+    def getAddonInfo(self, id):
+        return INFO.get(id, '')
+
+    def getSetting(self, id):
+        return SETTINGS.get(id, '')
+
+    def setSetting(self, id, value):
+        SETTINGS[id] = value
+
+    def getLocalizedString(self, id):
+        return str(id)
+
+    def openSettings(self):
+        pass
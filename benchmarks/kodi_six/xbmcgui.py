@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+
+class ListItem(object):
+    '''keeps what is set, so the listing build cost is close to the real one'''
+
+    def __init__(self, label='', label2='', path='', offscreen=False):
+        self.label = label
+        self.label2 = label2
+        self.path = path
+        self.art = {}
+        self.info = {}
+        self.properties = {}
+        self.subtitles = []
+        self.menuItems = []
+        self.folder = False
+
+    def setArt(self, values):
+        self.art.update(values)
+
+    def setInfo(self, type, infoLabels):
+        self.info.setdefault(type, {}).update(infoLabels)
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def getProperty(self, key):
+        return self.properties.get(key, '')
+
+    def setIsFolder(self, isFolder):
+        self.folder = isFolder
+
+    def setSubtitles(self, subtitleFiles):
+        self.subtitles = list(subtitleFiles)
+
+    def setPath(self, path):
+        self.path = path
+
+    def addContextMenuItems(self, items, replaceItems=False):
+        self.menuItems.extend(items)
+
+
+class Dialog(object):
+
+    def ok(self, heading, *lines):
+        return True
+
+    def notification(self, heading, message, *args, **kwargs):
+        pass
+
+
+class Window(object):
+    PROPERTIES = {}
+
+    def __init__(self, existingWindowId=-1):
+        self.properties = Window.PROPERTIES.setdefault(existingWindowId, {})
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def getProperty(self, key):
+        return self.properties.get(key, '')
+
+    def clearProperty(self, key):
+        self.properties.pop(key, None)
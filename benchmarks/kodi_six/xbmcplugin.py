@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+SORT_METHOD_NONE = 0
+SORT_METHOD_LABEL = 1
+SORT_METHOD_DATE = 3
+SORT_METHOD_UNSORTED = 40
+
+# (url, listitem, isFolder) of the directory items added, with the number of calls
+ITEMS = []
+CALLS = {'addDirectoryItem': 0, 'addDirectoryItems': 0}
+RESOLVED = []
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    CALLS['addDirectoryItem'] += 1
+    ITEMS.append((url, listitem, isFolder))
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    CALLS['addDirectoryItems'] += 1
+    ITEMS.extend(items)
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    pass
+
+
+def addSortMethod(handle, sortMethod, label2Mask=''):
+    pass
+
+
+def setContent(handle, content):
+    pass
+
+
+def setResolvedUrl(handle, succeeded, listitem):
+    RESOLVED.append((succeeded, listitem))
+
+
+def reset():
+    del ITEMS[:]
+    for key in CALLS:
+        CALLS[key] = 0
+    del RESOLVED[:]
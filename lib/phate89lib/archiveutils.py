@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import io
+import os
+import gzip
+import shutil
+import zipfile
+
+SUBEXTS = ('.srt', '.sub', '.txt', '.smi', '.ssa', '.ass')
+MAGICS = (
+    (b'PK\x03\x04', 'zip'),
+    (b'Rar!\x1a\x07', 'rar'),
+    (b'7z\xbc\xaf\x27\x1c', '7z'),
+    (b'\x1f\x8b', 'gz'),
+)
+MAGICSIZE = 8
+CHUNKSIZE = 64 * 1024
+
+
+def sniffArchive(header):
+    '''returns the archive type from the first bytes of a file, plain subtitles are "srt"'''
+    for magic, ext in MAGICS:
+        if header.startswith(magic):
+            return ext
+    return 'srt'
+
+
+def isSubtitle(name):
+    return os.path.splitext(name)[1].lower() in SUBEXTS
+
+
+def pickIndex(subs, index):
+    if index >= len(subs) or index < 0:
+        return 0
+    return index
+
+
+def copyTo(src, outName):
+    with open(outName, 'wb') as dst:
+        shutil.copyfileobj(src, dst, CHUNKSIZE)
+    return outName
+
+
+def extractZip(fileobj, dataPath, index=0):
+    '''streams the selected subtitle out of a zip file object, returns (index, path) or None'''
+    with zipfile.ZipFile(fileobj, 'r') as zf:
+        subs = [x for x in zf.namelist() if isSubtitle(x)]
+        if not subs:
+            return None
+        index = pickIndex(subs, index)
+        with zf.open(subs[index]) as src:
+            outName = copyTo(src, os.path.join(dataPath, os.path.basename(subs[index])))
+    return index, outName
+
+
+def extractGzip(fileobj, dataPath, name=''):
+    name = os.path.basename(name)
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    if not isSubtitle(name):
+        name = 'itasa.srt'
+    src = gzip.GzipFile(fileobj=fileobj, mode='rb')
+    try:
+        return 0, copyTo(src, os.path.join(dataPath, name))
+    finally:
+        src.close()
+
+
+class BackendError(Exception):
+    pass
+
+
+def extractRar(fileobj, dataPath, index=0):
+    '''
+        streams the selected subtitle out of a rar with the optional rarfile module
+        listing is pure python, compressed members need an unrar/unar/bsdtar tool
+    '''
+    import rarfile
+    try:
+        with rarfile.RarFile(fileobj) as rf:
+            subs = [x for x in rf.namelist() if isSubtitle(x)]
+            if not subs:
+                return None
+            index = pickIndex(subs, index)
+            with rf.open(subs[index]) as src:
+                outName = copyTo(src, os.path.join(dataPath, os.path.basename(subs[index])))
+    except rarfile.Error as ex:
+        raise BackendError(str(ex))
+    return index, outName
+
+
+def ioObject(fileobj):
+    '''
+        the io.IOBase under fileobj: SpooledTemporaryFile is one only from python 3.11,
+        its file is a BytesIO or a TemporaryFile (a wrapper of the real file on windows)
+    '''
+    for attr in ('_file', 'file'):
+        if isinstance(fileobj, io.IOBase):
+            break
+        fileobj = getattr(fileobj, attr, fileobj)
+    return fileobj
+
+
+def extract7z(fileobj, dataPath, index=0):
+    '''extracts the selected subtitle out of a 7z with the optional py7zr module'''
+    import py7zr
+    from py7zr import exceptions
+    tempFolder = os.path.join(dataPath, 'temp')
+    try:
+        # py7zr only accepts paths and io.IOBase objects (TypeError otherwise)
+        with py7zr.SevenZipFile(ioObject(fileobj), 'r') as sz:
+            subs = [x for x in sz.getnames() if isSubtitle(x)]
+            if not subs:
+                return None
+            index = pickIndex(subs, index)
+            sz.extract(path=tempFolder, targets=[subs[index]])
+    except (exceptions.ArchiveError, exceptions.PasswordRequired, TypeError) as ex:
+        # bad or encrypted archives, unsupported methods, crc and decompression errors
+        shutil.rmtree(tempFolder, ignore_errors=True)
+        raise BackendError(str(ex) or ex.__class__.__name__)
+    outName = os.path.join(dataPath, os.path.basename(subs[index]))
+    shutil.move(os.path.join(tempFolder, subs[index]), outName)
+    shutil.rmtree(tempFolder, ignore_errors=True)
+    return index, outName
+
+
+BACKENDS = {
+    'rar': ('rarfile', extractRar),
+    '7z': ('py7zr', extract7z),
+}
+
+
+def getExtractor(ext):
+    '''returns the python extractor for the archive type or None if its module is missing'''
+    if ext not in BACKENDS:
+        return None
+    module, extractor = BACKENDS[ext]
+    try:
+        __import__(module)
+    except ImportError:
+        return None
+    return extractor
+
+
+def findSubtitles(folder):
+    return sorted(os.path.join(root, name)
+                  for root, dirs, files in os.walk(folder)
+                  for name in files
+                  if isSubtitle(name))
@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    asyncio version of RUtils, to make many requests at once from a single thread
+    python 3 only: import it only from python 3 addons
+    requests go through aiohttp when installed, otherwise RUtils sends them in a thread pool
+        async def main():
+            async with AsyncRUtils() as r:
+                shows, news = await asyncio.gather(r.getJson(url1), r.getJson(url2))
+'''
+import asyncio
+import datetime
+import functools
+import threading
+import time
+from contextlib import asynccontextmanager
+from . import policy
+from .rutils import RUtils, splitRequestArgs, urlparse
+from .instrument import METRICS
+
+_BACKEND = []
+
+
+def getBackend():
+    '''aiohttp when installed, thread otherwise'''
+    if not _BACKEND:
+        try:
+            import aiohttp  # noqa: F401
+            _BACKEND.append('aiohttp')
+        except ImportError:
+            _BACKEND.append('thread')
+    return _BACKEND[0]
+
+
+class AsyncResponse(object):
+    '''the parts of requests.Response used by RUtils, from a read aiohttp response'''
+
+    def __init__(self, response, content, elapsed):
+        self.url = str(response.url)
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.encoding = response.charset
+        self.content = content
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', 'replace')
+
+    def json(self):
+        import json
+        return json.loads(self.text)
+
+    def close(self):
+        pass
+
+
+class _SyncView(object):
+    '''runs the synchronous RUtils methods on an AsyncRUtils instance (in a worker thread)'''
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def __getattr__(self, name):
+        attr = getattr(self._owner, name)
+        if asyncio.iscoroutinefunction(attr):
+            return functools.partial(getattr(RUtils, name), self)
+        return attr
+
+
+def _queryItems(params):
+    '''requests query semantics for aiohttp: None values skipped, lists repeated, everything else str'''
+    items = []
+    for key, value in params.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if item is None:
+                continue
+            if isinstance(item, bool) or not isinstance(item, (str, int, float)):
+                item = str(item)
+            items.append((key, item))
+    return items
+
+
+async def _blocking(func, *args):
+    '''runs func (file locks and file or db work) in the default executor'''
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+class AsyncRUtils(RUtils):
+    '''
+        same configuration (DEFPARAMS, USERAGENT, POLICIES, RATELIMITS...) and logging of RUtils
+        createRequest, getJson, getSoup, getText and getFileExtracted are coroutines,
+        getJsonStream is an async iterator
+        with the aiohttp backend the headers are per instance and the relay isn't used
+    '''
+    # 'aiohttp', 'thread' or None to use getBackend()
+    BACKEND = None
+    # max connections of the aiohttp session
+    MAXCONCURRENCY = 32
+
+    def __init__(self, *args, **kwargs):
+        self.backend = self.BACKEND or getBackend()
+        self.headers = {}
+        self.client = None
+        self._semaphores = {}
+        RUtils.__init__(self, *args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    def setHeader(self, voice, value):
+        if self.backend == 'aiohttp':
+            self.headers[voice] = value
+        else:
+            RUtils.setHeader(self, voice, value)
+
+    async def newSession(self):
+        await self.close()
+        self.headers = {}
+        if self.backend != 'aiohttp':
+            RUtils.newSession(self)
+        self.setUserAgent(self.USERAGENT)
+
+    def _client(self):
+        if self.client is None:
+            import aiohttp
+            self.client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.MAXCONCURRENCY),
+                                                cookie_jar=aiohttp.CookieJar(unsafe=True))
+        return self.client
+
+    async def _inThread(self, name, *args, **kwargs):
+        '''runs the synchronous RUtils method name in the default executor'''
+        method = functools.partial(getattr(RUtils, name), _SyncView(self), *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(None, method)
+
+    def _threadKwargs(self, kwargs):
+        '''the requests sent in a thread by the aiohttp backend need the instance headers'''
+        if self.backend == 'aiohttp' and self.headers:
+            headers = dict(self.headers)
+            headers.update(kwargs.get('headers') or {})
+            kwargs['headers'] = headers
+        return kwargs
+
+    async def createRequest(self, url, params=None, post=None, stream=False, addDefault=True, **kwargs):
+        if params is None:
+            params = {}
+        if addDefault:
+            params.update(self.DEFPARAMS)
+        if self.backend != 'aiohttp' or stream:
+            return await self._inThread('createRequest', url, params, post, stream, False,
+                                        **self._threadKwargs(kwargs))
+        key = entry = None
+        if self.httpcache is not None and post is None:
+            # the http cache reads and writes files, in the executor
+            key, entry, cached = await _blocking(self._fromHttpCache, url, params, kwargs)
+            if cached is not None:
+                return cached
+        start = time.time()
+        r = await self._sendAsync(url, params, post, **kwargs)
+        if METRICS.enabled:
+            self._recordRequest(url, r, start, False)
+        if r is None:
+            return False
+        if key is not None:
+            return await _blocking(self._checkResponse, r, key, entry)
+        return self._checkResponse(r)
+
+    async def _sendAsync(self, url, params, post, headers=None, timeout=None, verify=True, **kwargs):
+        '''aiohttp version of RUtils._sendWithPolicy'''
+        import aiohttp
+        host = urlparse(url).netloc
+        hostPolicy = policy.getPolicy(self.POLICIES, host, self.DEFPOLICY)
+        circuits = self._circuitBreaker()
+        if await _blocking(circuits.isOpen, host):
+            self.log("Error opening url %s. Too many failures, host skipped" % url)
+            return None
+        if timeout is None:
+            timeout = (hostPolicy['connect_timeout'], hostPolicy['read_timeout'])
+        elif not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        kwargs['timeout'] = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        if not verify:
+            kwargs['ssl'] = False
+        allHeaders = dict(self.headers)
+        allHeaders.update(headers or {})
+        method = 'GET' if post is None else 'POST'
+        attempts = policy.attempts(hostPolicy, post)
+        for attempt in range(attempts):
+            last = attempt + 1 >= attempts
+            try:
+                async with self._asyncSlot(host):
+                    start = time.time()
+                    async with self._client().request(method, url, params=_queryItems(params), data=post,
+                                                      headers=allHeaders, **kwargs) as res:
+                        elapsed = time.time() - start
+                        r = AsyncResponse(res, await res.read(), elapsed)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                if last:
+                    # one outcome per request, whatever the attempts
+                    await _blocking(circuits.record, host, hostPolicy)
+                    self.log("Error opening url %s: %r" % (url, ex))
+                    return None
+                self.log("Error opening url %s, retrying: %r" % (url, ex), 4)
+                await asyncio.sleep(policy.backoffDelay(hostPolicy, attempt))
+                continue
+            delay = policy.retryDelay(hostPolicy, r, attempt, last)
+            if delay is None:
+                await _blocking(circuits.record, host, hostPolicy, r.status_code)
+                return r
+            self.log("Error opening url %s (%s), retrying in %.1fs" % (url, r.status_code, delay), 4)
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def _asyncSlot(self, host):
+        '''RUtils._rateSlot without blocking the loop, the file locked bucket is taken in the executor'''
+        limits = self._rateLimits(host)
+        if not limits:
+            yield
+            return
+        semaphore = None
+        if limits.get('concurrency'):
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = asyncio.Semaphore(int(limits['concurrency']))
+            await semaphore.acquire()
+        try:
+            while True:
+                delay = await _blocking(self._rateLimiter().delay, host, limits)
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    async def getJson(self, url, params=None, post=None, **kwargs):
+        r = await self.createRequest(url, params, post, **kwargs)
+        if r:
+            try:
+                with METRICS.timer('parse', 'json', url=r.url):
+                    return self.decodeJson(r)
+            except ValueError:
+                self.log("Error serializing json")
+        return None
+
+    async def getSoup(self, url, params=None, post=None, parser="html.parser", strainer=None, **kwargs):
+        requestArgs, soupArgs = splitRequestArgs(kwargs)
+        r = await self.createRequest(url, params, post, **requestArgs)
+        if r:
+            return self.getSoupFromRes(r, parser, strainer, **soupArgs)
+        return False
+
+    async def getText(self, url, params=None, post=None, **kwargs):
+        r = await self.createRequest(url, params, post, **kwargs)
+        if r:
+            return r.text
+        return False
+
+    async def getFileExtracted(self, url, params=None, post=None, dataPath='', index=0):
+        '''download and extraction are blocking file work, they run in a thread with requests'''
+        return await self._inThread('getFileExtracted', url, params, post, dataPath, index)
+
+    async def getJsonStream(self, url, path='item', params=None, post=None, **kwargs):
+        '''
+            RUtils.getJsonStream as an async iterator: the download and the parsing run
+            in a thread and the values are yielded while they are parsed
+                async for show in r.getJsonStream(url, 'data.shows.item'):
+        '''
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        items = RUtils.getJsonStream(_SyncView(self), url, path, params, post, **self._threadKwargs(kwargs))
+
+        def put(item, error=None):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+            except RuntimeError:
+                # loop closed
+                stop.set()
+
+        def produce():
+            try:
+                for item in items:
+                    put(item)
+                    if stop.is_set():
+                        break
+            except Exception as ex:
+                put(_DONE, ex)
+                return
+            finally:
+                items.close()
+            put(_DONE)
+
+        loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is _DONE:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            # an early break stops the download at the next value
+            stop.set()
+
+    async def getJsonMany(self, requests_list, workers=None, **kwargs):
+        '''getJson of every (url, params, post) item concurrently, failed requests are None'''
+        return await self._runManyAsync(self.getJson, requests_list, None, workers, **kwargs)
+
+    async def getSoupMany(self, requests_list, workers=None, **kwargs):
+        '''getSoup of every (url, params, post) item concurrently, failed requests are False'''
+        return await self._runManyAsync(self.getSoup, requests_list, False, workers, **kwargs)
+
+    async def getTextMany(self, requests_list, workers=None, **kwargs):
+        '''getText of every (url, params, post) item concurrently, failed requests are False'''
+        return await self._runManyAsync(self.getText, requests_list, False, workers, **kwargs)
+
+    async def _runManyAsync(self, func, requests_list, failValue, workers=None, **kwargs):
+        semaphore = asyncio.Semaphore(workers or self.MAXCONCURRENCY)
+
+        async def run(item):
+            if not isinstance(item, (tuple, list)):
+                item = (item,)
+            async with semaphore:
+                try:
+                    return await func(*item, **kwargs)
+                except Exception as ex:
+                    self.log("Error opening url %s: %s" % (item[0], ex))
+                    return failValue
+        return list(await asyncio.gather(*[run(item) for item in requests_list]))
+
+
+_DONE = object()
+_TASKS = {}
+
+
+def _startFlight(key, compute):
+    '''the task computing key, started if no other call is computing it'''
+    task = _TASKS.get(key)
+    if task is None:
+        task = _TASKS[key] = asyncio.ensure_future(compute())
+        task.add_done_callback(lambda t: _TASKS.pop(key, None))
+    return task
+
+
+def async_cacheable(hours=0, days=0, stale_hours=0, exclude=(), tags=(), cache_failures=False, shared=False):
+    '''
+        kodiutils.cacheable for coroutine methods, with the same keys and cache entries
+        concurrent calls of the same key await a single task, with stale_hours an expired
+        result is returned for that long while a task refreshes it
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        async def decorated(*args, **kwargs):
+            from . import kodiutils
+            method_class = args[0]
+            cache_str = kodiutils._methodCacheKey(method_class, func, args, kwargs, exclude)
+            cache = getattr(method_class, 'cache', None)
+            expiration = datetime.timedelta(hours=hours, days=days)
+            staleness = datetime.timedelta(hours=stale_hours)
+
+            async def compute():
+                result = await func(*args, **kwargs)
+                if cache is not None and (cache_failures or not kodiutils._isFailure(result)):
+                    # SimpleCache, cache index and blob writes
+                    await _blocking(kodiutils._storeCached, cache, cache_str, result, expiration, staleness,
+                                    kodiutils._formatTags(tags, func, args, kwargs), shared)
+                return result
+
+            def logRefresh(task):
+                if not task.cancelled() and task.exception() is not None:
+                    kodiutils.log("Background refresh of %s failed: %s" % (cache_str, task.exception()))
+
+            if (cache is not None and not kwargs.get("ignore_cache", False)
+                    and not getattr(method_class, 'ignore_cache', False)):
+                # MEMCACHE on the loop, SimpleCache in the executor
+                cached = kodiutils._lookupCached(None, cache_str, expiration, shared)
+                if cached is None:
+                    cached = await _blocking(kodiutils._lookupCached, cache, cache_str, expiration, shared)
+                if cached is not None:
+                    data, tier = cached
+                    if tier == 'stale' and cache_str not in _TASKS:
+                        _startFlight(cache_str, compute).add_done_callback(logRefresh)
+                    METRICS.record('cache', func.__name__, key=cache_str, hit=tier, ms=0)
+                    return data
+            with METRICS.timer('cache', func.__name__, key=cache_str, hit='miss'):
+                # shielded: a cancelled caller doesn't cancel the others awaiting the task
+                return await asyncio.shield(_startFlight(cache_str, compute))
+        return decorated
+    return decorator
@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    maintenance of the cacheable entries kept in the SimpleCache db
+    keys are namespaced "addon id/class/method.hash", the entries written by this addon are
+    listed in an index db of the addon profile (namespace, size, creation, expiration, tags)
+    that gives the stats and the age/size pruning without reading the values
+        maintenance = cachemaint.getMaintenance()
+        maintenance.invalidate('MyRUtils', 'getShows')
+        maintenance.invalidateTag('show:123')
+        maintenance.prune(maxBytes=50 * 1024 * 1024, maxAge=7 * 86400)
+'''
+import os
+import time
+import sqlite3
+import threading
+from .cacheutils import MEMCACHE
+from .staticutils import FileLock
+
+SIMPLECACHEID = 'script.module.simplecache'
+# SimpleCache keeps its entries in the home window too
+CACHEWINDOW = 10000
+# keys deleted with a single statement
+CHUNK = 200
+VACUUMPAGES = 1000
+
+
+def prefixRange(prefix):
+    '''bounds of the keys starting with prefix, for an indexed range query'''
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def keyNamespace(key):
+    '''"addon/class/method" of a cacheable key'''
+    if key.endswith('.lock'):
+        key = key[:-5]
+    return key.rsplit('.', 1)[0]
+
+
+class CacheIndex(object):
+    '''
+        sqlite index of the cacheable entries written by the addon, it's only a hint:
+        writes are not synced and failures are ignored
+        the expired rows are dropped by the writes at most every EXPIREINTERVAL seconds
+    '''
+    EXPIREINTERVAL = 6 * 3600
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._conn = None
+        self._nextExpire = 0
+
+    def connect(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries(key TEXT PRIMARY KEY, namespace TEXT, '
+                         'size INTEGER, created REAL, expires REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS tags(tag TEXT, key TEXT, PRIMARY KEY(tag, key))')
+            conn.execute('CREATE INDEX IF NOT EXISTS tagskey ON tags(key)')
+            conn.execute('CREATE INDEX IF NOT EXISTS entriescreated ON entries(created)')
+            self._conn = conn
+        return self._conn
+
+    def execute(self, query, args=()):
+        with self.lock:
+            try:
+                return self.connect().execute(query, args).fetchall()
+            except (sqlite3.Error, EnvironmentError):
+                return []
+
+    def add(self, key, size, expires, tags=()):
+        '''a single unsynced statement for the entries without tags'''
+        row = (key, keyNamespace(key), size, time.time(), expires)
+        with self.lock:
+            begun = False
+            try:
+                conn = self.connect()
+                if not tags:
+                    conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', row)
+                else:
+                    conn.execute('BEGIN')
+                    begun = True
+                    conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', row)
+                    conn.execute('DELETE FROM tags WHERE key = ?', (key,))
+                    conn.executemany('INSERT OR IGNORE INTO tags VALUES (?, ?)', [(tag, key) for tag in tags])
+                    conn.execute('COMMIT')
+            except (sqlite3.Error, EnvironmentError):
+                if begun:
+                    try:
+                        self._conn.execute('ROLLBACK')
+                    except sqlite3.Error:
+                        pass
+                return
+        self.expireIfDue()
+
+    def expire(self):
+        '''drops the rows of the expired entries'''
+        now = time.time()
+        self.execute('DELETE FROM tags WHERE key IN (SELECT key FROM entries WHERE expires < ?)', (now,))
+        self.execute('DELETE FROM entries WHERE expires < ?', (now,))
+
+    def expireIfDue(self):
+        '''expire if the last one (of any process, the mtime of the stamp file) is older than EXPIREINTERVAL'''
+        now = time.time()
+        if now < self._nextExpire:
+            return False
+        stamp = self.path + '.stamp'
+        try:
+            last = os.path.getmtime(stamp)
+        except OSError:
+            last = 0
+        if now - last < self.EXPIREINTERVAL:
+            self._nextExpire = last + self.EXPIREINTERVAL
+            return False
+        self._nextExpire = now + self.EXPIREINTERVAL
+        try:
+            with open(stamp, 'w'):
+                pass
+        except EnvironmentError:
+            return False
+        self.expire()
+        return True
+
+    def remove(self, keys):
+        for start in range(0, len(keys), CHUNK):
+            chunk = keys[start:start + CHUNK]
+            marks = ','.join('?' * len(chunk))
+            self.execute('DELETE FROM entries WHERE key IN (%s)' % marks, chunk)
+            self.execute('DELETE FROM tags WHERE key IN (%s)' % marks, chunk)
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CacheMaintenance(object):
+    '''
+        addonId is the namespace root, dbFile the SimpleCache db, dataPath the addon profile,
+        codec the cacheutils.CacheCodec of the entries (for the blob files)
+    '''
+
+    def __init__(self, addonId, dbFile, dataPath, codec=None, log=None):
+        self.addonId = addonId
+        self.dbFile = dbFile
+        self.dataPath = dataPath
+        self.codec = codec
+        self.index = CacheIndex(os.path.join(dataPath, 'cacheindex.db'))
+        self.log = log or (lambda msg, level=2: None)
+
+    def _simplecache(self):
+        if not os.path.exists(self.dbFile):
+            return None
+        return sqlite3.connect(self.dbFile, timeout=30, isolation_level=None)
+
+    def namespace(self, className=None, method=None):
+        prefix = self.addonId + '/'
+        if className:
+            prefix += className + '/'
+            if method:
+                prefix += method + '.'
+        return prefix
+
+    def _removeKeys(self, keys):
+        '''removes keys (and their locks) from every tier: db, window, MEMCACHE, blobs and index'''
+        keys = sorted(set(keys))
+        if not keys:
+            return 0
+        allKeys = keys + [key + '.lock' for key in keys]
+        conn = self._simplecache()
+        if conn is not None:
+            try:
+                for start in range(0, len(allKeys), CHUNK):
+                    chunk = allKeys[start:start + CHUNK]
+                    conn.execute('DELETE FROM simplecache WHERE id IN (%s)' % ','.join('?' * len(chunk)), chunk)
+            except sqlite3.Error as ex:
+                self.log("Error removing cache entries: %s" % ex)
+            finally:
+                conn.close()
+        try:
+            from kodi_six import xbmcgui
+            window = xbmcgui.Window(CACHEWINDOW)
+            for key in allKeys:
+                window.clearProperty(key)
+        except ImportError:
+            pass
+        for key in keys:
+            MEMCACHE.delete(key)
+            if self.codec is not None and self.codec.path:
+                try:
+                    os.remove(self.codec.blobFile(key))
+                except OSError:
+                    pass
+        self.index.remove(keys)
+        return len(keys)
+
+    def invalidatePrefix(self, prefix):
+        '''removes every entry whose key starts with prefix, returns how many'''
+        low, high = prefixRange(prefix)
+        keys = [row[0] for row in self.index.execute('SELECT key FROM entries WHERE key >= ? AND key < ?',
+                                                     (low, high))]
+        conn = self._simplecache()
+        if conn is not None:
+            try:
+                keys.extend(row[0] for row in conn.execute('SELECT id FROM simplecache WHERE id >= ? AND id < ?',
+                                                           (low, high)) if not row[0].endswith('.lock'))
+            except sqlite3.Error as ex:
+                self.log("Error reading cache entries: %s" % ex)
+            finally:
+                conn.close()
+        MEMCACHE.deletePrefix(prefix)
+        return self._removeKeys(keys)
+
+    def invalidate(self, className=None, method=None):
+        '''removes the entries of a method, of all the methods of a class, or of the whole addon'''
+        return self.invalidatePrefix(self.namespace(className, method))
+
+    def invalidateTag(self, *tags):
+        '''removes the entries stored with any of tags'''
+        keys = []
+        for tag in tags:
+            keys.extend(row[0] for row in self.index.execute('SELECT key FROM tags WHERE tag = ?', (tag,)))
+        return self._removeKeys(keys)
+
+    def clearAll(self, httpcache=None):
+        '''removes every entry of the addon, the in process MEMCACHE, the blob files and httpcache'''
+        removed = self.invalidate()
+        MEMCACHE.clear()
+        if self.codec is not None and self.codec.path and os.path.isdir(self.codec.path):
+            for name in os.listdir(self.codec.path):
+                if name.endswith('.blob'):
+                    try:
+                        os.remove(os.path.join(self.codec.path, name))
+                    except OSError:
+                        pass
+        if httpcache is not None:
+            httpcache.clear()
+        return removed
+
+    def prune(self, maxBytes=None, maxAge=None, vacuumPages=VACUUMPAGES):
+        '''
+            removes the expired entries of the SimpleCache db (of every addon, as its own
+            cleanup does), the entries of the addon older than maxAge seconds and the oldest
+            ones while they take more than maxBytes, then frees up to vacuumPages db pages
+        '''
+        now = time.time()
+        removed = 0
+        conn = self._simplecache()
+        if conn is not None:
+            try:
+                removed += conn.execute('DELETE FROM simplecache WHERE expires < ?', (int(now),)).rowcount
+            except sqlite3.Error as ex:
+                self.log("Error pruning the cache: %s" % ex)
+            finally:
+                conn.close()
+        self.index.expire()
+        if maxAge:
+            keys = self.index.execute('SELECT key FROM entries WHERE created < ?', (now - maxAge,))
+            removed += self._removeKeys([row[0] for row in keys])
+        if maxBytes:
+            total = (self.index.execute('SELECT SUM(size) FROM entries') or [(0,)])[0][0] or 0
+            keys = []
+            if total > maxBytes:
+                for key, size in self.index.execute('SELECT key, size FROM entries ORDER BY created'):
+                    if total <= maxBytes:
+                        break
+                    keys.append(key)
+                    total -= size or 0
+            removed += self._removeKeys(keys)
+        if self.codec is not None:
+            self.codec.pruneBlobs()
+        self.vacuum(vacuumPages)
+        self.log("Cache pruned, %d entries removed in %.1f ms" % (removed, (time.time() - now) * 1000), 4)
+        return removed
+
+    def vacuum(self, pages=VACUUMPAGES):
+        '''
+            gives back to the filesystem up to pages free pages of the dbs, the SimpleCache
+            db is switched once to incremental auto vacuum (with a full vacuum)
+        '''
+        self.index.execute('PRAGMA incremental_vacuum(%d)' % int(pages))
+        conn = self._simplecache()
+        if conn is None:
+            return
+        try:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+            conn.execute('PRAGMA incremental_vacuum(%d)' % int(pages)).fetchall()
+        except sqlite3.Error as ex:
+            self.log("Error vacuuming the cache: %s" % ex)
+        finally:
+            conn.close()
+
+    def pruneIfDue(self, interval=6 * 3600, **kwargs):
+        '''prune at most once every interval seconds among all the processes of the addon'''
+        stamp = os.path.join(self.dataPath, 'cacheprune.stamp')
+        try:
+            if time.time() - os.path.getmtime(stamp) < interval:
+                return False
+        except OSError:
+            pass
+        lock = FileLock(stamp + '.lock', timeout=0)
+        if not lock.acquire():
+            return False
+        try:
+            with open(stamp, 'w'):
+                pass
+            self.prune(**kwargs)
+        finally:
+            lock.release()
+        return True
+
+    def pruneInBackground(self, interval=6 * 3600, **kwargs):
+        '''pruneIfDue in a thread, the plugin can call it and go on with the listing'''
+        thread = threading.Thread(target=self.pruneIfDue, args=(interval,), kwargs=kwargs)
+        thread.start()
+        return thread
+
+    def stats(self):
+        '''entries and bytes (stored, compressed) of every namespace of the addon, with the other tiers'''
+        low, high = prefixRange(self.namespace())
+        namespaces = {}
+        for namespace, entries, size in self.index.execute(
+                'SELECT namespace, COUNT(*), SUM(size) FROM entries WHERE key >= ? AND key < ? AND expires >= ? '
+                'GROUP BY namespace', (low, high, time.time())):
+            namespaces[namespace] = {'entries': entries, 'bytes': size or 0}
+        result = {'namespaces': namespaces, 'memcache': MEMCACHE.stats()}
+        try:
+            result['db_bytes'] = os.path.getsize(self.dbFile)
+        except OSError:
+            result['db_bytes'] = 0
+        blobs = [0, 0]
+        if self.codec is not None and self.codec.path and os.path.isdir(self.codec.path):
+            for name in os.listdir(self.codec.path):
+                if name.endswith('.blob'):
+                    blobs[0] += 1
+                    try:
+                        blobs[1] += os.path.getsize(os.path.join(self.codec.path, name))
+                    except OSError:
+                        pass
+        result['blobs'] = {'files': blobs[0], 'bytes': blobs[1]}
+        return result
+
+
+_MAINTENANCE = []
+
+
+def getMaintenance():
+    '''the CacheMaintenance of the running addon'''
+    if not _MAINTENANCE:
+        from kodi_six import xbmc, xbmcaddon
+        from . import kodiutils
+        profile = xbmcaddon.Addon(SIMPLECACHEID).getAddonInfo('profile')
+        dbFile = os.path.join(xbmc.translatePath(profile), 'simplecache.db')
+        _MAINTENANCE.append(CacheMaintenance(kodiutils.getConst('ID'), dbFile, kodiutils.getConst('DATA_PATH_T'),
+                                             kodiutils.getCacheCodec(), kodiutils.log))
+    return _MAINTENANCE[0]
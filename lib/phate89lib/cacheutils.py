@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import time
+import base64
+import pickle
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+CODECMARKER = '__codec__'
+# pickle protocol readable by python 2 and 3
+PICKLEPROTOCOL = 2
+_ZSTD = []
+
+
+def _getZstd():
+    '''(compress, decompress) of the installed zstd module, None if missing'''
+    if not _ZSTD:
+        try:
+            try:
+                from compression import zstd
+            except ImportError:
+                from backports import zstd
+            _ZSTD.append((zstd.compress, zstd.decompress))
+        except ImportError:
+            try:
+                import zstandard
+                _ZSTD.append((zstandard.ZstdCompressor().compress,
+                              zstandard.ZstdDecompressor().decompress))
+            except ImportError:
+                _ZSTD.append(None)
+    return _ZSTD[0]
+
+
+def compress(data, level=6):
+    '''returns (codec, compressed data), zstd when installed, zlib otherwise'''
+    zstd = _getZstd()
+    if zstd is not None:
+        return 'zstd', zstd[0](data)
+    return 'zlib', zlib.compress(data, level)
+
+
+def decompress(codec, data):
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'zstd':
+        zstd = _getZstd()
+        if zstd is None:
+            raise ValueError('zstd compressed data but no zstd module')
+        try:
+            return zstd[1](data)
+        except Exception as ex:
+            # every zstd module has its own error class
+            raise ValueError('corrupted zstd data: %s' % ex)
+    return data
+
+
+def approxSize(value):
+    '''cheap estimate of the memory used by a decoded json like value'''
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    try:
+        if isinstance(value, basestring):  # noqa: F821 python 2
+            return len(value)
+    except NameError:
+        if isinstance(value, str):
+            return len(value)
+    if isinstance(value, dict):
+        return 16 + sum(approxSize(k) + approxSize(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return 16 + sum(approxSize(v) for v in value)
+    return 8
+
+
+class LRUCache(object):
+    '''
+        in process least recently used cache bounded by number of entries and approximate bytes
+        values are kept as they are given, so a hit is a dict access (cacheable gives it
+        pickled results, unless shared, so that every hit is a copy)
+    '''
+
+    def __init__(self, maxEntries=512, maxBytes=16 * 1024 * 1024):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxEntries=None, maxBytes=None):
+        with self._lock:
+            if maxEntries is not None:
+                self.maxEntries = maxEntries
+            if maxBytes is not None:
+                self.maxBytes = maxBytes
+            self._evict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, size, expires = item
+            if expires is not None and expires < time.time():
+                self._remove(key)
+                self.misses += 1
+                return default
+            # move the entry to the end (most recently used)
+            del self._data[key]
+            self._data[key] = item
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expires=None, size=None):
+        if size is None:
+            size = approxSize(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if size > self.maxBytes:
+                return
+            self._data[key] = (value, size, expires)
+            self.bytes += size
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def deletePrefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self.bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+    def _remove(self, key):
+        self.bytes -= self._data.pop(key)[1]
+
+    def _evict(self):
+        while self._data and (len(self._data) > self.maxEntries or self.bytes > self.maxBytes):
+            self.bytes -= self._data.popitem(last=False)[1][1]
+            self.evictions += 1
+
+
+class CacheCodec(object):
+    '''
+        packs the values stored in SimpleCache (that keeps their repr in the db):
+        pickled, compressed above MINCOMPRESS bytes and base64 encoded
+        if path is given, values with an expiration bigger than MAXINLINE bytes once packed
+        are written to a blob file in path and the db keeps only the reference, the
+        expired blobs are removed by the writes at most every PRUNEINTERVAL seconds
+    '''
+    MINCOMPRESS = 1024
+    MAXINLINE = 64 * 1024
+    PRUNEINTERVAL = 6 * 3600
+
+    def __init__(self, path=None):
+        self.path = path
+        self._nextPrune = 0
+
+    @staticmethod
+    def isPacked(value):
+        return isinstance(value, dict) and CODECMARKER in value
+
+    def blobFile(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.blob')
+
+    @staticmethod
+    def dumps(value):
+        return pickle.dumps(value, PICKLEPROTOCOL)
+
+    @staticmethod
+    def loads(raw):
+        '''a new copy of the value pickled in raw, None if corrupted'''
+        try:
+            return pickle.loads(raw)
+        except Exception:
+            # corrupted data, or a pickle of a class renamed or moved since (AttributeError, ImportError)
+            return None
+
+    def encode(self, key, value, expires=None):
+        '''returns the packed value, its size (pickled, before compression) is in "size"'''
+        return self.pack(key, self.dumps(value), expires)
+
+    def decode(self, packed):
+        '''the original value, None if the blob is missing or corrupted'''
+        if not self.isPacked(packed):
+            return packed
+        raw = self.unpack(packed)
+        if raw is None:
+            return None
+        return self.loads(raw)
+
+    def pack(self, key, raw, expires=None):
+        '''encode of a value already pickled (raw)'''
+        packed = {CODECMARKER: 'raw', 'size': len(raw)}
+        if len(raw) >= self.MINCOMPRESS:
+            packed[CODECMARKER], raw = compress(raw)
+        packed['stored'] = len(raw)
+        if self.path and expires and len(raw) > self.MAXINLINE and self._writeBlob(key, raw, expires):
+            packed['blob'] = os.path.basename(self.blobFile(key))
+            self.pruneBlobsIfDue()
+        else:
+            packed['data'] = base64.b64encode(raw).decode('ascii')
+        return packed
+
+    def unpack(self, packed):
+        '''the pickled value of a packed one, None if the blob is missing or corrupted'''
+        try:
+            if 'blob' in packed:
+                if not self.path:
+                    return None
+                with open(os.path.join(self.path, packed['blob']), 'rb') as fd:
+                    raw = fd.read()
+            else:
+                raw = base64.b64decode(packed['data'])
+            return decompress(packed[CODECMARKER], raw)
+        except (EnvironmentError, ValueError, TypeError, KeyError, zlib.error):
+            return None
+
+    def _writeBlob(self, key, raw, expires):
+        name = self.blobFile(key)
+        tmp = '%s.%s.tmp' % (name, os.getpid())
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            with open(tmp, 'wb') as fd:
+                fd.write(raw)
+            # the modification time is the expiration, used by pruneBlobs
+            os.utime(tmp, (expires, expires))
+            try:
+                os.replace(tmp, name)
+            except AttributeError:
+                if os.path.exists(name):
+                    os.remove(name)
+                os.rename(tmp, name)
+        except EnvironmentError:
+            return False
+        return True
+
+    def pruneBlobs(self):
+        '''removes the expired blob files (and the temp files left by a crash), returns how many'''
+        if not self.path or not os.path.isdir(self.path):
+            return 0
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                if ((name.endswith('.blob') and os.path.getmtime(path) < now)
+                        or (name.endswith('.tmp') and os.path.getmtime(path) < now - 3600)):
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def pruneBlobsIfDue(self):
+        '''pruneBlobs if the last one (of any process, the mtime of prune.stamp) is older than PRUNEINTERVAL'''
+        now = time.time()
+        if not self.path or now < self._nextPrune:
+            return 0
+        stamp = os.path.join(self.path, 'prune.stamp')
+        try:
+            last = os.path.getmtime(stamp)
+        except OSError:
+            last = 0
+        if now - last < self.PRUNEINTERVAL:
+            self._nextPrune = last + self.PRUNEINTERVAL
+            return 0
+        self._nextPrune = now + self.PRUNEINTERVAL
+        try:
+            with open(stamp, 'w'):
+                pass
+        except EnvironmentError:
+            return 0
+        return self.pruneBlobs()
+
+
+# shared by cacheable and the http cache for the life of the invocation
+MEMCACHE = LRUCache()
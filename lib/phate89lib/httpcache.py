@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import hashlib
+import zlib
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+from .cacheutils import MEMCACHE, CacheCodec, compress, decompress
+from .staticutils import PY2
+
+DROPHEADERS = ('content-encoding', 'transfer-encoding', 'content-length', 'connection')
+
+
+def _utf8(value):
+    '''python 2 urlencode can't encode non ascii unicode'''
+    if PY2 and isinstance(value, unicode):  # noqa: F821 python 2
+        return value.encode('utf-8')
+    return value
+
+
+def parseCacheControl(value):
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        key, _, val = part.partition('=')
+        directives[key.strip()] = val.strip().strip('"')
+    return directives
+
+
+def getMaxAge(headers):
+    directives = parseCacheControl(headers.get('cache-control'))
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    try:
+        return max(int(directives.get('max-age', 0)), 0)
+    except ValueError:
+        return 0
+
+
+class HttpCache(object):
+    '''
+        on disk cache of http responses based on the ETag/Last-Modified validators
+        every entry is stored as a json metadata file plus the body, compressed if
+        bigger than CacheCodec.MINCOMPRESS (the codec and the real size are in the metadata)
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def createKey(method, url, params=None):
+        query = urlencode(sorted((_utf8(k), _utf8(v)) for k, v in (params or {}).items()))
+        raw = u'%s %s?%s' % (method.upper(), url, query)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _memKey(self, key):
+        return 'http.' + key
+
+    def _file(self, key, ext):
+        return os.path.join(self.path, key + ext)
+
+    def _write(self, name, data, mode='wb'):
+        tmp = '%s.%s.tmp' % (name, os.getpid())
+        with open(tmp, mode) as fd:
+            fd.write(data)
+        try:
+            os.replace(tmp, name)
+        except AttributeError:
+            if os.path.exists(name):
+                os.remove(name)
+            os.rename(tmp, name)
+
+    def get(self, key):
+        cached = MEMCACHE.get(self._memKey(key))
+        if cached is not None:
+            return cached[0]
+        try:
+            with open(self._file(key, '.json'), 'r') as fd:
+                return json.load(fd)
+        except (EnvironmentError, ValueError):
+            return None
+
+    def getBody(self, key, entry=None):
+        cached = MEMCACHE.get(self._memKey(key))
+        if cached is not None:
+            return cached[1]
+        if entry is None:
+            entry = self.get(key) or {}
+        try:
+            with open(self._file(key, '.body'), 'rb') as fd:
+                return decompress(entry.get('codec', 'raw'), fd.read())
+        except (EnvironmentError, ValueError, zlib.error):
+            return None
+
+    def isFresh(self, entry):
+        return entry is not None and entry.get('expires', 0) > time.time()
+
+    def getValidators(self, entry):
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def set(self, key, response):
+        maxAge = getMaxAge(response.headers)
+        etag = response.headers.get('etag')
+        lastModified = response.headers.get('last-modified')
+        if maxAge is None or not (maxAge or etag or lastModified):
+            self.delete(key)
+            return False
+        entry = {
+            'url': response.url,
+            'status': response.status_code,
+            'encoding': response.encoding,
+            'headers': dict((k, v) for k, v in response.headers.items() if k.lower() not in DROPHEADERS),
+            'etag': etag,
+            'last_modified': lastModified,
+            'expires': time.time() + maxAge,
+            'codec': 'raw',
+            'size': len(response.content),
+        }
+        body = response.content
+        if len(body) >= CacheCodec.MINCOMPRESS:
+            entry['codec'], body = compress(body)
+        try:
+            self._write(self._file(key, '.body'), body)
+            self._write(self._file(key, '.json'), json.dumps(entry), 'w')
+        except EnvironmentError:
+            return False
+        MEMCACHE.set(self._memKey(key), (entry, response.content), size=len(response.content))
+        return True
+
+    def refresh(self, key, entry, response):
+        '''updates the stored entry after a 304 Not Modified answer'''
+        maxAge = getMaxAge(response.headers)
+        if maxAge is None:
+            self.delete(key)
+            return
+        entry['expires'] = time.time() + maxAge
+        for header, field in (('etag', 'etag'), ('last-modified', 'last_modified')):
+            if response.headers.get(header):
+                entry[field] = response.headers[header]
+        try:
+            self._write(self._file(key, '.json'), json.dumps(entry), 'w')
+        except EnvironmentError:
+            pass
+
+    def delete(self, key):
+        MEMCACHE.delete(self._memKey(key))
+        for ext in ('.json', '.body'):
+            try:
+                os.remove(self._file(key, ext))
+            except OSError:
+                pass
+
+    def prune(self, maxAge=None):
+        '''
+            removes the expired entries that can't be revalidated (no ETag/Last-Modified)
+            and, with maxAge, the ones stored more than maxAge seconds ago
+        '''
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            if not name.endswith('.json'):
+                continue
+            key = name[:-5]
+            try:
+                if maxAge and os.path.getmtime(os.path.join(self.path, name)) < now - maxAge:
+                    entry = None
+                else:
+                    entry = self.get(key)
+            except OSError:
+                continue
+            if entry is None or (not self.isFresh(entry) and not self.getValidators(entry)):
+                self.delete(key)
+                removed += 1
+        return removed
+
+    def clear(self):
+        for name in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            if name.endswith('.json'):
+                self.delete(name[:-5])
+        MEMCACHE.deletePrefix('http.')
+
+    def buildResponse(self, key, entry):
+        body = self.getBody(key, entry)
+        if body is None:
+            return None
+        MEMCACHE.set(self._memKey(key), (entry, body), size=len(body))
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        r = requests.Response()
+        r._content = body
+        r.status_code = entry.get('status', 200)
+        r.reason = 'OK'
+        r.headers = CaseInsensitiveDict(entry.get('headers', {}))
+        r.url = entry.get('url')
+        r.encoding = entry.get('encoding')
+        r.from_cache = True
+        return r
+
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    timing of requests, cache lookups, parsing and of the whole invocation
+    disabled by default, enable it with the sinks to use, ie:
+        instrument.METRICS.enable(instrument.LogSink(kodiutils.log),
+                                  instrument.JsonLinesSink('/path/metrics.jsonl'))
+        instrument.METRICS.startProfile('/path/profile.out')
+    kodiutils.endScript and setResolvedUrl close the invocation and flush the sinks
+'''
+import json
+import time
+from contextlib import contextmanager
+
+# as close as we can get to the start of the plugin process
+START = time.time()
+
+
+class MemorySink(object):
+    '''keeps the records in a list, for tests'''
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def flush(self):
+        pass
+
+
+class JsonLinesSink(object):
+    '''appends every record as a json line'''
+
+    def __init__(self, path):
+        self.path = path
+        self.lines = []
+
+    def write(self, record):
+        self.lines.append(json.dumps(record, sort_keys=True))
+
+    def flush(self):
+        if not self.lines:
+            return
+        with open(self.path, 'a') as fd:
+            fd.write('\n'.join(self.lines) + '\n')
+        self.lines = []
+
+
+class LogSink(object):
+    '''writes a summary (count and time by kind and name) with the log function at flush'''
+
+    def __init__(self, log, level=2):
+        self.log = log
+        self.level = level
+        self.summary = {}
+
+    def write(self, record):
+        item = self.summary.setdefault((record['kind'], record['name']), [0, 0.0])
+        item[0] += 1
+        item[1] += record.get('ms', 0)
+
+    def flush(self):
+        for (kind, name), (count, ms) in sorted(self.summary.items()):
+            self.log("[%s] %s: %d in %.1f ms" % (kind, name, count, ms), self.level)
+        self.summary = {}
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self.enabled = False
+        self.sinks = []
+        self.profile = None
+        self.profilePath = None
+
+    def enable(self, *sinks):
+        self.sinks.extend(sinks)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.sinks = []
+
+    def record(self, kind, name, **fields):
+        if not self.enabled:
+            return
+        fields['kind'] = kind
+        fields['name'] = name
+        fields['ts'] = time.time()
+        for sink in self.sinks:
+            sink.write(fields)
+
+    @contextmanager
+    def timer(self, kind, name, **fields):
+        if not self.enabled:
+            yield fields
+            return
+        start = time.time()
+        try:
+            yield fields
+        finally:
+            self.record(kind, name, ms=(time.time() - start) * 1000, **fields)
+
+    def startProfile(self, path):
+        '''profiles the invocation with cProfile, the stats are dumped to path at finish'''
+        import cProfile
+        self.profile = cProfile.Profile()
+        self.profilePath = path
+        self.profile.enable()
+
+    def finish(self, event):
+        '''closes the invocation: records the time since the process start and flushes everything'''
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.profilePath)
+            self.profile = None
+        if not self.enabled:
+            return
+        self.record('invocation', event, ms=(time.time() - START) * 1000)
+        for sink in self.sinks:
+            try:
+                sink.flush()
+            except EnvironmentError:
+                pass
+
+
+METRICS = Metrics()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+
+_DECODER = []
+
+
+def _simplejson():
+    '''simplejson only with its C speedups, the pure python one (ie in Kodi) is slower than json'''
+    import simplejson
+    from simplejson import scanner
+    if getattr(scanner, 'c_make_scanner', None) is None:
+        raise ImportError('simplejson without speedups')
+    return simplejson
+
+
+def getDecoder():
+    '''(name, module) of the fastest json decoder installed, resolved on first use'''
+    if not _DECODER:
+        for name, load in (('orjson', lambda: __import__('orjson')), ('ujson', lambda: __import__('ujson')),
+                           ('simplejson', _simplejson)):
+            try:
+                _DECODER.append((name, load()))
+                break
+            except ImportError:
+                continue
+        else:
+            _DECODER.append(('json', json))
+    return _DECODER[0]
+
+
+def loads(data):
+    '''decodes json text or utf-8 bytes with the fastest decoder installed'''
+    return getDecoder()[1].loads(data)
+
+
+def walkPath(obj, path):
+    '''
+        yields the values at an ijson like path of a decoded json
+        ie "item" for the elements of a top level array, "data.shows.item"
+    '''
+    parts = path.split('.') if path else []
+
+    def walk(node, i):
+        if i == len(parts):
+            yield node
+            return
+        part = parts[i]
+        if part == 'item':
+            if isinstance(node, list):
+                for child in node:
+                    for value in walk(child, i + 1):
+                        yield value
+        elif isinstance(node, dict) and part in node:
+            for value in walk(node[part], i + 1):
+                yield value
+    return walk(obj, 0)
+
+
+def iterItems(response, path='item'):
+    '''
+        yields the values at path while a streamed requests response downloads
+        with ijson installed, otherwise decodes the whole body and walks it
+    '''
+    try:
+        import ijson
+    except ImportError:
+        for value in walkPath(loads(response.content), path):
+            yield value
+        return
+    response.raw.decode_content = True
+    try:
+        items = ijson.items(response.raw, path, use_float=True)
+    except TypeError:
+        # ijson before 3.1 has no use_float
+        items = ijson.items(response.raw, path)
+    for value in items:
+        yield value
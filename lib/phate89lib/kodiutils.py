@@ -4,8 +4,10 @@ import os
 import re
 import sys
 import time
+import threading
 import traceback
 import datetime
+import hashlib
 from functools import wraps
 from contextlib import contextmanager
 from kodi_six import xbmc, xbmcaddon, xbmcplugin, xbmcgui  # pyright: reportMissingImports=false
@@ -14,21 +16,55 @@ try:
 except ImportError:
     from urllib import urlencode
 from . import staticutils
+from .cacheutils import MEMCACHE, CacheCodec
+from . import instrument
+from .instrument import METRICS
 if sys.version_info < (2, 7):
     import simplejson as json
 else:
     import json
+try:
+    STRTYPES = (basestring,)  # noqa: F821 python 2
+except NameError:
+    STRTYPES = (str,)
+
+# addon constants are resolved on first use (getConst or module attribute access)
+_LAZY = {
+    'ADDON': lambda: _loadAddon(),
+    'ID': lambda: getConst('ADDON').getAddonInfo('id'),
+    'NAME': lambda: getConst('ADDON').getAddonInfo('name'),
+    'VERSION': lambda: getConst('ADDON').getAddonInfo('version'),
+    'PATH': lambda: getConst('ADDON').getAddonInfo('path'),
+    'DATA_PATH': lambda: getConst('ADDON').getAddonInfo('profile'),
+    'PATH_T': lambda: xbmc.translatePath(getConst('PATH')),
+    'DATA_PATH_T': lambda: xbmc.translatePath(getConst('DATA_PATH')),
+    'IMAGE_PATH_T': lambda: os.path.join(getConst('PATH_T'), 'resources', 'media', ""),
+    'LANGUAGE': lambda: getConst('ADDON').getLocalizedString,
+}
+
+
+def _loadAddon():
+    addon = xbmcaddon.Addon()
+    globals()['ADDON'] = addon
+    if sys.argv and len(sys.argv) > 2:
+        log("Starting module '%s' version '%s' with command '%s'" % (
+            getConst('NAME'), getConst('VERSION'), sys.argv[2]), 1)
+    return addon
+
+
+def getConst(name):
+    g = globals()
+    if name not in g:
+        g[name] = _LAZY[name]()
+    return g[name]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getConst(name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
 
-ADDON = xbmcaddon.Addon()
-ID = ADDON.getAddonInfo('id')
-NAME = ADDON.getAddonInfo('name')
-VERSION = ADDON.getAddonInfo('version')
-PATH = ADDON.getAddonInfo('path')
-DATA_PATH = ADDON.getAddonInfo('profile')
-PATH_T = xbmc.translatePath(PATH)
-DATA_PATH_T = xbmc.translatePath(DATA_PATH)
-IMAGE_PATH_T = os.path.join(PATH_T, 'resources', 'media', "")
-LANGUAGE = ADDON.getLocalizedString
 KODILANGUAGE = xbmc.getLocalizedString
 HANDLE = -1
 
@@ -42,15 +78,17 @@ def executebuiltin(func, block=False):
     xbmc.executebuiltin(func, block)
 
 def getMedia(asset=''):
-    return os.path.join(PATH_T, 'resources', 'media', asset)
+    return os.path.join(getConst('PATH_T'), 'resources', 'media', asset)
 
-def notify(message='', header=NAME, time=3000, icon=''):
+def notify(message='', header=None, time=3000, icon=''):
+    if header is None:
+        header = getConst('NAME')
     message = 'Notification(%s,%s,%i,%s)' % (header, message, time, icon)
     xbmc.executebuiltin(message)
 
 def log(msg, level=2):
     try:
-        message = u'%s: %s' % (ID, msg)
+        message = u'%s: %s' % (getConst('ID'), msg)
         if level > 1:
             xbmc.log(msg=message, level=xbmc.LOGDEBUG)
         else:
@@ -58,7 +96,7 @@ def log(msg, level=2):
             if level == 0:
                 notify(msg)
     except Exception as ex:
-        error = u'%s: %s' % (ID, createError(ex))
+        error = u'%s: %s' % (getConst('ID'), createError(ex))
         xbmc.log(msg=error, level=xbmc.LOGDEBUG)
         pass
 
@@ -82,28 +120,57 @@ def py2_encode(*args, **kwargs):
     return staticutils.py2_encode(*args, **kwargs)
 
 
+# settings read in this invocation, by (id, type): every ADDON.getSetting crosses into kodi
+_SETTINGS = {}
+
+
+def _cachedSetting(setting, kind, convert):
+    key = (setting, kind)
+    if key not in _SETTINGS:
+        if kind == 'str':
+            _SETTINGS[key] = getConst('ADDON').getSetting(setting).strip()
+        else:
+            _SETTINGS[key] = convert(getSetting(setting))
+    return _SETTINGS[key]
+
+
+def _toNum(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0
+
+
 def getSetting(setting):
-    return ADDON.getSetting(setting).strip()
+    return _cachedSetting(setting, 'str', None)
 
 
 def getSettingAsBool(setting):
-    return getSetting(setting).lower() == "true"
+    return _cachedSetting(setting, 'bool', lambda value: value.lower() == "true")
 
 
 def getSettingAsNum(setting):
-    num = 0
-    try:
-        num = float(getSetting(setting))
-    except ValueError:
-        pass
-    return num
+    return _cachedSetting(setting, 'num', _toNum)
 
 
 def setSetting(setting, value):
-    ADDON.setSetting(id=setting, value=str(value))
+    getConst('ADDON').setSetting(id=setting, value=str(value))
+    for kind in ('bool', 'num'):
+        _SETTINGS.pop((setting, kind), None)
+    _SETTINGS[(setting, 'str')] = str(value).strip()
+
+
+def invalidateSettings():
+    '''
+        forgets the settings read so far, for long running scripts
+        (ie services, from xbmc.Monitor.onSettingsChanged)
+    '''
+    _SETTINGS.clear()
+
 
 def openSettings():
-    ADDON.openSettings()
+    getConst('ADDON').openSettings()
+    invalidateSettings()
 
 def getKeyboard():
     return xbmc.Keyboard()
@@ -122,7 +189,8 @@ def showOkDialog(heading, line):
     xbmcgui.Dialog().ok(heading, line)
 
 
-def addListItem(label="", params=None, label2=None, thumb=None, fanart=None, poster=None, arts=None, videoInfo=None, properties=None, isFolder=True, menuItems=None):
+def createListItem(label="", params=None, label2=None, thumb=None, fanart=None, poster=None, arts=None, videoInfo=None, properties=None, isFolder=True, menuItems=None):
+    '''builds the (url, listitem, isFolder) tuple of a directory item'''
     if arts is None:
         arts = {}
     if properties is None:
@@ -155,15 +223,130 @@ def addListItem(label="", params=None, label2=None, thumb=None, fanart=None, pos
             item.setProperty(key, value)
     if menuItems:
         item.addContextMenuItems(menuItems)
+    return url, item, isFolder
+
+
+def addListItem(*args, **kwargs):
+    if _DIRECTORY:
+        return _DIRECTORY[0].add(*args, **kwargs)
+    url, item, isFolder = createListItem(*args, **kwargs)
     return xbmcplugin.addDirectoryItem(handle=HANDLE, url=url, listitem=item, isFolder=isFolder)
 
 
-def setResolvedUrl(url="", solved=True, subs=None, headers=None, ins=None, insdata=None, properties=None):
+class DirectoryBuilder(object):
+    '''
+        collects the directory items (same arguments of addListItem) and gives them
+        to kodi with addDirectoryItems in chunks of chunkSize items
+    '''
+
+    def __init__(self, totalItems=0, chunkSize=500):
+        self.totalItems = totalItems
+        self.chunkSize = chunkSize
+        self.items = []
+
+    def add(self, *args, **kwargs):
+        self.items.append(createListItem(*args, **kwargs))
+        if len(self.items) >= self.chunkSize:
+            return self.flush()
+        return True
+
+    def flush(self):
+        if not self.items:
+            return True
+        items, self.items = self.items, []
+        return xbmcplugin.addDirectoryItems(HANDLE, items, self.totalItems)
+
+
+_DIRECTORY = []
+
+
+def startDirectory(totalItems=0, chunkSize=500):
+    '''
+        from now on addListItem collects the items in a DirectoryBuilder,
+        they're added in batches and at the latest by endScript
+    '''
+    flushDirectory()
+    _DIRECTORY.append(DirectoryBuilder(totalItems, chunkSize))
+    return _DIRECTORY[0]
+
+
+def flushDirectory():
+    if _DIRECTORY:
+        return _DIRECTORY.pop().flush()
+    return True
+
+
+# window where the pre-resolved streams are kept between invocations (home window)
+RESOLVEDWINDOW = 10000
+RESOLVEDTTL = 300
+
+
+def _resolvedProperty(key):
+    return '%s.resolved.%s' % (getConst('ID'), key)
+
+
+def storeResolved(key, url, subs=None, headers=None, ins=None, insdata=None, properties=None, ttl=RESOLVEDTTL):
+    '''
+        keeps the arguments of setResolvedUrl for the item key (ie while building the listing,
+        when the manifest url is already known) so playResolved doesn't resolve it again
+        the stream is kept for ttl seconds, manifest urls usually expire
+    '''
+    data = {'expires': time.time() + ttl, 'args': {'url': url, 'subs': subs, 'headers': headers, 'ins': ins,
+                                                  'insdata': insdata, 'properties': properties}}
+    xbmcgui.Window(RESOLVEDWINDOW).setProperty(_resolvedProperty(key), json.dumps(data))
+
+
+def getResolved(key):
+    '''the setResolvedUrl arguments stored for key, None if missing or expired'''
+    window = xbmcgui.Window(RESOLVEDWINDOW)
+    raw = window.getProperty(_resolvedProperty(key))
+    if not raw:
+        return None
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        data = {}
+    if data.get('expires', 0) < time.time():
+        window.clearProperty(_resolvedProperty(key))
+        return None
+    return data['args']
+
+
+def playResolved(key, resolve=None):
+    '''
+        plays the stream stored by storeResolved for key, if it's missing or expired
+        resolve() is called and has to return the setResolvedUrl arguments (None if not found)
+    '''
+    args = getResolved(key)
+    source = 'stored'
+    if args is None:
+        source = 'resolved'
+        args = resolve() if resolve is not None else None
+    if not args:
+        return setResolvedUrl(solved=False, source=source)
+    return setResolvedUrl(source=source, **args)
+
+
+def _notifyStarted(data):
+    jsonRpc('JSONRPC.NotifyAll', {'sender': getConst('ID'), 'message': 'onAVStarted', 'data': data})
+
+
+def setResolvedUrl(url="", solved=True, subs=None, headers=None, ins=None, insdata=None, properties=None,
+                   source=None):
+    '''
+        gives the stream to kodi and ends the script, the onAVStarted notification is sent
+        in a thread after the stream is handed over, so playback doesn't wait for it
+        source is reported with the resolve time in the metrics
+    '''
     headerUrl = ""
     if headers:
         headerUrl = urlencode(headers)
     path = url + "|" + headerUrl
-    item = xbmcgui.ListItem(path=path)
+    try:
+        item = xbmcgui.ListItem(path=path, offscreen=True)
+    except TypeError:
+        # kodi < 18
+        item = xbmcgui.ListItem(path=path)
     if subs is not None:
         item.setSubtitles(subs)
     if ins:
@@ -176,12 +359,16 @@ def setResolvedUrl(url="", solved=True, subs=None, headers=None, ins=None, insda
         for key, value in list(properties.items()):
             item.setProperty(key, value)
     xbmcplugin.setResolvedUrl(HANDLE, solved, item)
-    # result = kodiutils.kodiJsonRequest({'jsonrpc': '2.0', 'method': 'Player.Open', 'params': {'item': playerId, "properties": ["time","totaltime"]}, 'id': 1})
+    elapsed = (time.time() - instrument.START) * 1000
+    log("Resolved %s in %.1f ms (%s)" % (url, elapsed, source or 'direct'), 4)
+    METRICS.record('resolve', source or 'direct', url=url, solved=solved, ms=elapsed)
     if solved:
-        log('item: {}'.format(str(item)), 4)
-        properties['path'] = path
-        properties['url'] = url
-        kodiJsonRequest({'jsonrpc': '2.0', 'method': 'JSONRPC.NotifyAll', 'params': {'sender': ID, 'message': 'onAVStarted' , 'data': properties}, 'id': 1})
+        data = dict(properties or {})
+        data['path'] = path
+        data['url'] = url
+        # not a daemon: the interpreter waits for it before exiting
+        threading.Thread(target=_notifyStarted, args=(data,)).start()
+    METRICS.finish('setResolvedUrl')
     sys.exit()
 
 
@@ -203,6 +390,18 @@ def append_subtitle(sUrl, subtitlename, sync=False, provider=None):
                        isFolder=False)
 
 
+def append_subtitles(subtitles, provider=None, episode=None):
+    '''
+        adds a list of (url, release name) subtitles ranked against the playing episode
+        (or the given getEpisodeInfo like dict), the sync flag is set for the same release
+    '''
+    from .submatch import rankSubtitles
+    if episode is None:
+        episode = getEpisodeInfo()
+    for sub in rankSubtitles(episode, [(name, url) for url, name in subtitles]):
+        append_subtitle(sub.data, sub.name, sync=sub.sync, provider=provider)
+
+
 def setContent(ctype):
     if ctype:
         xbmcplugin.setContent(HANDLE, ctype)
@@ -211,6 +410,8 @@ def setContent(ctype):
 def endScript(message=None, loglevel=2, closedir=True, update_listing=False, update_dir=False):
     if message:
         log(message, loglevel)
+    flushDirectory()
+    METRICS.finish('endScript')
     if closedir:
         xbmcplugin.addSortMethod(HANDLE, xbmcplugin.SORT_METHOD_UNSORTED)
         xbmcplugin.addSortMethod(HANDLE, xbmcplugin.SORT_METHOD_LABEL)
@@ -222,24 +423,18 @@ def endScript(message=None, loglevel=2, closedir=True, update_listing=False, upd
 
 
 def createAddonFolder():
-    if not os.path.isdir(DATA_PATH_T):
+    if not os.path.isdir(getConst('DATA_PATH_T')):
         log("Creating the addon data folder")
-        os.makedirs(DATA_PATH_T)
+        os.makedirs(getConst('DATA_PATH_T'))
 
 
 def getShowID():
-    json_query = xbmc.executeJSONRPC((
-        '{"jsonrpc":"2.0","method":"Player.GetItem","params":'
-        '{"playerid":1,"properties":["tvshowid"]},"id":1}'))
-    jsn_player_item = json.loads(py2_decode(json_query, 'utf-8', errors='ignore'))
-    if 'result' in jsn_player_item and jsn_player_item['result']['item']['type'] == 'episode':
-        json_query = xbmc.executeJSONRPC((
-            '{"jsonrpc":"2.0","id":1,"method":"VideoLibrary.GetTVShowDetails","params":'
-            '{"tvshowid":%s, "properties": ["imdbnumber"]}}') % (
-                jsn_player_item['result']['item']['tvshowid']))
-        jsn_ep_det = json.loads(py2_decode(json_query, 'utf-8', errors='ignore'))
-        if 'result' in jsn_ep_det and jsn_ep_det['result']['tvshowdetails']['imdbnumber'] != '':
-            return str(jsn_ep_det['result']['tvshowdetails']['imdbnumber'])
+    item = jsonRpc('Player.GetItem', {'playerid': 1, 'properties': ['tvshowid']})
+    if item and item['item']['type'] == 'episode':
+        details = jsonRpc('VideoLibrary.GetTVShowDetails',
+                          {'tvshowid': item['item']['tvshowid'], 'properties': ['imdbnumber']})
+        if details and details['tvshowdetails']['imdbnumber'] != '':
+            return str(details['tvshowdetails']['imdbnumber'])
     return False
 
 
@@ -311,28 +506,368 @@ def closeBusy():
 def refresh():
     xbmc.executebuiltin('Container.Refresh()')
 
+LIBRARYMEDIA = {'tvshow': 'TVShow', 'movie': 'Movie', 'episode': 'Episode', 'musicvideo': 'MusicVideo'}
+
+
+class JsonRpcClient(object):
+    '''
+        kodi JSON-RPC client: batch sends many calls with a single executeJSONRPC and
+        the results of the read only methods (namespace.Get*, but the volatile namespaces)
+        are kept for the invocation, a call changing a namespace forgets its results
+    '''
+    VOLATILE = ('Player.', 'Playlist.', 'GUI.', 'Application.', 'XBMC.', 'JSONRPC.', 'Input.')
+
+    def __init__(self):
+        self.memo = {}
+        self.lastId = 0
+
+    def isMemoizable(self, method):
+        return method.split('.')[-1].startswith('Get') and not method.startswith(self.VOLATILE)
+
+    def _memoKey(self, method, params):
+        return method + json.dumps(params, sort_keys=True)
+
+    def invalidate(self, namespace=None):
+        '''forgets the memoized results of namespace (ie "VideoLibrary"), of every method without it'''
+        if namespace is None:
+            self.memo.clear()
+            return
+        for key in [k for k in self.memo if k.startswith(namespace + '.')]:
+            del self.memo[key]
+
+    def execute(self, payload):
+        '''sends a raw request (or list of requests), returns the decoded reply'''
+        from . import jsonutils
+        return jsonutils.loads(xbmc.executeJSONRPC(json.dumps(payload)))
+
+    def call(self, method, params=None):
+        '''result of method, None on errors'''
+        return self.batch([(method, params)])[0]
+
+    def batch(self, calls):
+        '''
+            calls is a list of (method, params), returns their results in the same order
+            (None for the failed ones), the memoized ones aren't sent again
+        '''
+        results = [None] * len(calls)
+        pending = {}
+        for index, (method, params) in enumerate(calls):
+            params = params or {}
+            key = self._memoKey(method, params)
+            if key in self.memo:
+                results[index] = self.memo[key]
+                continue
+            if not self.isMemoizable(method):
+                self.invalidate(method.split('.')[0])
+            self.lastId += 1
+            pending[self.lastId] = (index, method, params, key)
+        if not pending:
+            return results
+        payload = [{'jsonrpc': '2.0', 'method': method, 'params': params, 'id': requestId}
+                   for requestId, (index, method, params, key) in sorted(pending.items())]
+        try:
+            replies = self.execute(payload if len(payload) > 1 else payload[0])
+        except ValueError as ex:
+            log("JSON-RPC reply not valid: %s" % ex)
+            return results
+        if isinstance(replies, dict):
+            replies = [replies]
+        for reply in replies:
+            if reply.get('id') not in pending:
+                continue
+            index, method, params, key = pending[reply['id']]
+            if 'result' in reply:
+                results[index] = reply['result']
+                if self.isMemoizable(method):
+                    self.memo[key] = reply['result']
+            else:
+                log("[%s] %s" % (method, reply.get('error', {}).get('message')))
+        return results
+
+    def getLibraryIndex(self, media, key='label', properties=()):
+        '''
+            {key value: item} of the library items of media (tvshow, movie, episode, musicvideo)
+            with a single call, ie getLibraryIndex('movie', 'imdbnumber', ['playcount'])
+        '''
+        properties = set(properties)
+        if key != 'label':
+            properties.add(key)
+        result = self.call('VideoLibrary.Get%ss' % LIBRARYMEDIA[media],
+                           {'properties': sorted(properties)} if properties else None) or {}
+        return dict((item.get(key), item) for item in result.get(media + 's', []))
+
+    def getDetailsMany(self, media, ids, properties=()):
+        '''details of many library items of media in one batch, returns {id: details} of the found ones'''
+        ids = list(ids)
+        method = 'VideoLibrary.Get%sDetails' % LIBRARYMEDIA[media]
+        results = self.batch([(method, {media + 'id': itemId, 'properties': list(properties)}) for itemId in ids])
+        return dict((itemId, result[media + 'details']) for itemId, result in zip(ids, results) if result)
+
+
+JSONRPC = JsonRpcClient()
+
+
+def jsonRpc(method, params=None):
+    return JSONRPC.call(method, params)
+
+
+def jsonRpcBatch(calls):
+    return JSONRPC.batch(calls)
+
+
 def kodiJsonRequest(params):
-    result = None
-    response = None
+    '''sends a complete JSON-RPC request dict (or list of them for a batch) and returns its result'''
+    if isinstance(params, list):
+        return JSONRPC.batch([(item['method'], item.get('params')) for item in params])
+    return JSONRPC.call(params['method'], params.get('params'))
+
+
+CACHEMARKER = '__cacheable__'
+LOCKWAIT = 10
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+class _Flight(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _singleFlight(key, compute):
+    '''runs compute once for all the threads asking the same key at the same time'''
+    with _INFLIGHT_LOCK:
+        flight = _INFLIGHT.get(key)
+        leader = flight is None
+        if leader:
+            flight = _INFLIGHT[key] = _Flight()
+    if not leader:
+        flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
     try:
-        data = json.dumps(params)
-        request = xbmc.executeJSONRPC(data)
-        response = json.loads(request)
-        if 'result' in response:
-            result = response['result']
-    except KeyError:
-        log("[%s] %s" % (params['method'], response['error']['message']))
-    return result
-
-if sys.argv and len(sys.argv)>2:
-    log("Starting module '%s' version '%s' with command '%s'" % (NAME, VERSION, sys.argv[2]), 1)
-
-def cacheable(hours=0, days=0):
+        flight.result = compute()
+    except Exception as ex:
+        flight.error = ex
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+        flight.event.set()
+    return flight.result
+
+
+def _refreshInBackground(key, compute):
+    with _INFLIGHT_LOCK:
+        if key in _INFLIGHT:
+            return
+
+    def refresh():
+        try:
+            _singleFlight(key, compute)
+        except Exception as ex:
+            log("Background refresh of %s failed: %s" % (key, ex))
+    threading.Thread(target=refresh).start()
+
+
+def _waitOtherProcess(cache, key):
+    '''
+        another process (ie a service) is computing the same key
+        wait a bit for its result instead of calling the upstream again
+    '''
+    if not cache.get(key + '.lock'):
+        return None
+    end = time.time() + LOCKWAIT
+    while time.time() < end:
+        time.sleep(0.1)
+        cachedata = getCacheCodec().decode(cache.get(key))
+        if cachedata is not None:
+            return cachedata
+        if not cache.get(key + '.lock'):
+            break
+    return None
+
+
+_CODEC = []
+
+
+def getCacheCodec():
+    '''codec of the cacheable entries, big values are kept in the "cache" folder of the addon profile'''
+    if not _CODEC:
+        _CODEC.append(CacheCodec(os.path.join(getConst('DATA_PATH_T'), 'cache')))
+    return _CODEC[0]
+
+
+def _unwrapCached(cachedata):
+    if isinstance(cachedata, dict) and cachedata.get(CACHEMARKER):
+        return cachedata['data'], cachedata['expires']
+    # entries written before the stale support are always fresh
+    return cachedata, None
+
+
+def _canonical(value):
+    '''
+        repr like text of value that keeps the types (tuple/list, 1/"1"/1.0/True)
+        and doesn't depend on the order of dicts and sets
+    '''
+    if isinstance(value, dict):
+        items = sorted(u'%s:%s' % (_canonical(k), _canonical(v)) for k, v in value.items())
+        return u'{%s}' % u','.join(items)
+    if isinstance(value, (set, frozenset)):
+        return u'%s{%s}' % (value.__class__.__name__, u','.join(sorted(_canonical(v) for v in value)))
+    if isinstance(value, list):
+        return u'[%s]' % u','.join(_canonical(v) for v in value)
+    if isinstance(value, tuple):
+        return u'(%s)' % u','.join(_canonical(v) for v in value)
+    if isinstance(value, STRTYPES):
+        # python 2 str and unicode of the same text are the same argument
+        try:
+            return json.dumps(value)
+        except UnicodeDecodeError:
+            pass
+    return u'%r' % (value,)
+
+
+def _namedArgs(func, args, kwargs):
+    '''
+        the arguments of a method call bound to their names, defaults included
+        the instance (the first positional argument) is left out by position
+    '''
+    import inspect
+    try:
+        signature = inspect.signature(func)
+    except AttributeError:
+        # python 2: no signature, getcallargs of a decorated method gives the wrapper arguments
+        spec = inspect.getargspec(func)
+        named = inspect.getcallargs(func, *args, **kwargs)
+        if spec.args:
+            named.pop(spec.args[0])
+        elif spec.varargs:
+            named[spec.varargs] = named[spec.varargs][1:]
+        return named
+    params = list(signature.parameters.values())
+    if params and params[0].kind in (params[0].POSITIONAL_ONLY, params[0].POSITIONAL_OR_KEYWORD):
+        signature = signature.replace(parameters=params[1:])
+    bound = signature.bind(*args[1:], **kwargs)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def createCacheKey(prefix, func, args, kwargs, exclude=()):
+    '''
+        builds a fixed size cache key from the arguments of a method call
+        arguments are bound to their names (so defaults and positional/named calls
+        give the same key), serialized in a canonical way and hashed
+    '''
+    exclude = ('ignore_cache',) + tuple(exclude)
+    kwargs = dict((k, v) for k, v in kwargs.items() if k not in exclude)
+    try:
+        named = _namedArgs(func, args, kwargs)
+    except (TypeError, ValueError):
+        named = {'args': list(args[1:]), 'kwargs': kwargs}
+    else:
+        named = dict((k, v) for k, v in named.items() if k not in exclude)
+    raw = _canonical(named)
+    return "%s.%s" % (prefix, hashlib.sha1(raw.encode('utf-8')).hexdigest())
+
+
+def _methodCacheKey(obj, func, args, kwargs, exclude=()):
+    '''"addon id/class/method.hash", the namespaces of cachemaint'''
+    return createCacheKey("%s/%s/%s" % (getConst('ID'), obj.__class__.__name__, func.__name__),
+                          func, args, kwargs, exclude)
+
+
+def _formatTags(tags, func, args, kwargs):
+    '''tags can use the named arguments of the call, ie "show:{show_id}"'''
+    if not any('{' in tag for tag in tags):
+        return tags
+    try:
+        named = _namedArgs(func, args, kwargs)
+    except (TypeError, ValueError):
+        named = kwargs
+    return [tag.format(**named) for tag in tags]
+
+
+def _lookupCached(cache, key, expiration, shared=False):
+    '''
+        cached entry of key from MEMCACHE or cache (None for MEMCACHE only),
+        returns (data, tier) or None, tier is 'mem', 'db' or 'stale' if the entry
+        is expired but still kept
+        MEMCACHE keeps the pickled envelope, so every call gets its own copy, with
+        shared the envelope itself (a hit is a dict access, the result is read only)
+    '''
+    codec = getCacheCodec()
+    tier = 'mem'
+    cachedata = MEMCACHE.get(key)
+    if cachedata is None:
+        if cache is None:
+            return None
+        tier = 'db'
+        packed = cache.get(key)
+        if not CacheCodec.isPacked(packed):
+            # entries written before the cache codec
+            if packed is None:
+                return None
+            cachedata = packed
+        else:
+            raw = codec.unpack(packed)
+            cachedata = None if raw is None else codec.loads(raw)
+            if cachedata is None:
+                return None
+            MEMCACHE.set(key, cachedata if shared else raw, time.time() + expiration.total_seconds(),
+                         size=len(raw))
+    elif isinstance(cachedata, bytes):
+        cachedata = codec.loads(cachedata)
+        if cachedata is None:
+            MEMCACHE.delete(key)
+            return None
+    data, expires = _unwrapCached(cachedata)
+    if expires is not None and expires < time.time():
+        tier = 'stale'
+    return data, tier
+
+
+def _storeCached(cache, key, result, expiration, staleness, tags=(), shared=False):
+    '''
+        stores the envelope packed by the cache codec in cache and pickled (or as it is
+        if shared) in MEMCACHE, and lists it in the cachemaint index with its tags
+    '''
+    cachedata = {CACHEMARKER: 1, 'data': result, 'expires': time.time() + expiration.total_seconds()}
+    keep = time.time() + (expiration + staleness).total_seconds()
+    codec = getCacheCodec()
+    raw = codec.dumps(cachedata)
+    packed = codec.pack(key, raw, keep)
+    cache.set(key, packed, expiration=expiration + staleness)
+    MEMCACHE.set(key, cachedata if shared else raw, keep, size=len(raw))
+    from .cachemaint import getMaintenance
+    getMaintenance().index.add(key, packed['stored'], keep, tags)
+
+
+def _isFailure(result):
+    '''None and False are what getJson, getSoup... return when the request fails'''
+    return result is None or result is False
+
+
+def cacheable(hours=0, days=0, stale_hours=0, exclude=(), tags=(), cross_process=False, cache_failures=False,
+              shared=False):
     '''
         wrapper around our simple cache to use as decorator
         Usage: define an instance of SimpleCache with name "cache" (self.cache) in your class
         Any method that needs caching just add @use_cache as decorator
-        NOTE: use unnamed arguments for calling the method and named arguments for optional settings
+        positional and named arguments are both part of the cache key, named arguments
+        listed in exclude (and ignore_cache) are considered optional settings and ignored
+        concurrent calls of the same key share a single computation, with stale_hours
+        an expired result is returned for that long while it's refreshed in background
+        results are also kept pickled in the in process MEMCACHE tier, every call
+        returns its own copy, with shared the same object is returned by every hit
+        (no unpickling) so callers must not modify it
+        tags (formatted with the named arguments, ie "show:{show_id}") group entries
+        for cachemaint invalidateTag
+        with cross_process a marker in the cache makes other processes (ie a service)
+        computing the same key wait for its result instead of calling the upstream too
+        None and False results are not stored (a stale entry is kept) unless cache_failures
     '''
     def decorator(func):
         '''our decorator'''
@@ -340,25 +875,48 @@ def cacheable(hours=0, days=0):
         def decorated(*args, **kwargs):
             '''process the original method and apply caching of the results'''
             method_class = args[0]
-            method_class_name = method_class.__class__.__name__
-            cache_str = "%s.%s.%s" % (ID, method_class_name, func.__name__)
-            # cache identifier is based on positional args only
-            # named args are considered optional and ignored
-            for item in args[1:]:
-                cache_str += u".%s" % item
-            cache_str = cache_str.lower()
-            cachedata = method_class.cache.get(cache_str) if hasattr(method_class, 'cache') else None
+            cache_str = _methodCacheKey(method_class, func, args, kwargs, exclude)
+            cache = getattr(method_class, 'cache', None)
             global_cache_ignore = False
             try:
                 global_cache_ignore = method_class.ignore_cache
             except Exception:
                 pass
-            if cachedata is not None and not kwargs.get("ignore_cache", False) and not global_cache_ignore:
-                return cachedata
-            else:
-                result = func(*args, **kwargs)
-                if hasattr(method_class, 'cache'):
-                    method_class.cache.set(cache_str, result, expiration=datetime.timedelta(hours=hours, days=days))
+            expiration = datetime.timedelta(hours=hours, days=days)
+            staleness = datetime.timedelta(hours=stale_hours)
+
+            def compute():
+                marker = cross_process and cache is not None
+                if marker:
+                    cachedata = _waitOtherProcess(cache, cache_str)
+                    if cachedata is not None:
+                        return _unwrapCached(cachedata)[0]
+                    cache.set(cache_str + '.lock', True, expiration=datetime.timedelta(seconds=LOCKWAIT))
+                try:
+                    result = func(*args, **kwargs)
+                    if cache is not None and (cache_failures or not _isFailure(result)):
+                        _storeCached(cache, cache_str, result, expiration, staleness,
+                                     _formatTags(tags, func, args, kwargs), shared)
+                finally:
+                    if marker:
+                        cache.set(cache_str + '.lock', False, expiration=datetime.timedelta(seconds=1))
                 return result
+
+            if cache is not None and not kwargs.get("ignore_cache", False) and not global_cache_ignore:
+                cached = _lookupCached(cache, cache_str, expiration, shared)
+                if cached is not None:
+                    data, tier = cached
+                    if tier == 'stale':
+                        _refreshInBackground(cache_str, compute)
+                    METRICS.record('cache', func.__name__, key=cache_str, hit=tier, ms=0)
+                    return data
+            with METRICS.timer('cache', func.__name__, key=cache_str, hit='miss'):
+                return _singleFlight(cache_str, compute)
         return decorated
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+if sys.version_info < (3, 7):
+    # no module __getattr__ before python 3.7, resolve the addon constants now
+    for _name in list(_LAZY):
+        getConst(_name)
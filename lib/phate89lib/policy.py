@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import time
+import random
+import threading
+from email.utils import parsedate_tz, mktime_tz
+from .staticutils import FileLock
+
+DEFPOLICY = {
+    # seconds to open the connection and between two bytes of the answer
+    'connect_timeout': 5,
+    'read_timeout': 30,
+    # extra attempts for idempotent requests (GET, or POST with retry_post)
+    'retries': 2,
+    'retry_post': False,
+    'retry_statuses': (429, 500, 502, 503, 504),
+    # jittered exponential backoff: random between 0 and backoff * 2 ^ attempt, max backoff_max
+    'backoff': 0.5,
+    'backoff_max': 10,
+    # consecutive failures opening the circuit and seconds before trying the host again
+    'circuit_failures': 5,
+    'circuit_reset': 60,
+}
+
+
+def getPolicy(policies, host, default=None):
+    policy = dict(default or DEFPOLICY)
+    policy.update(policies.get(host, {}))
+    return policy
+
+
+def backoffDelay(policy, attempt):
+    return random.uniform(0, min(policy['backoff_max'], policy['backoff'] * (2 ** attempt)))
+
+
+def retryAfter(response):
+    '''seconds asked by the Retry-After header (seconds or http date), None if missing'''
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(mktime_tz(parsed) - time.time(), 0)
+
+
+def attempts(policy, post=None):
+    '''requests sent at most: GET (or POST with retry_post) are retried'''
+    if post is None or policy['retry_post']:
+        return 1 + policy['retries']
+    return 1
+
+
+def retryDelay(policy, response, attempt, last=False):
+    '''seconds to wait before sending the request again, None if response is the final one'''
+    if last or response.status_code not in policy['retry_statuses']:
+        return None
+    delay = retryAfter(response)
+    if delay is None:
+        return backoffDelay(policy, attempt)
+    if delay > policy['backoff_max']:
+        return None
+    return delay
+
+
+class CircuitBreaker(object):
+    '''
+        counts the consecutive failures of every host, after circuit_failures the host
+        is skipped for circuit_reset seconds, then a request is let through again
+        with path the state is kept in a file locked json per host, so a failing host
+        is skipped by the next invocations too, otherwise it lives in the process
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.hosts = {}
+        self.lock = threading.Lock()
+        if path and not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                pass
+
+    def _stateFile(self, host):
+        return os.path.join(self.path, re.sub(r'[^a-z0-9.-]', '_', host.lower()) + '.json')
+
+    def _read(self, stateFile):
+        try:
+            with open(stateFile, 'r') as fd:
+                state = json.load(fd)
+            return [int(state['failures']), float(state['open_until'])]
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            return None
+
+    def _state(self, host):
+        if not self.path:
+            return self.hosts.get(host)
+        return self._read(self._stateFile(host))
+
+    def isOpen(self, host):
+        state = self._state(host)
+        return state is not None and state[1] > time.time()
+
+    def failure(self, host, policy):
+        '''counts a failure of host, returns True if the circuit is open'''
+        if not self.path:
+            with self.lock:
+                state = self.hosts.setdefault(host, [0, 0])
+                return self._count(state, policy)
+        stateFile = self._stateFile(host)
+        try:
+            with FileLock(stateFile + '.lock'):
+                state = self._read(stateFile) or [0, 0]
+                isOpen = self._count(state, policy)
+                with open(stateFile, 'w') as fd:
+                    json.dump({'failures': state[0], 'open_until': state[1]}, fd)
+        except EnvironmentError:
+            # state not available, don't block the request
+            return False
+        return isOpen
+
+    def record(self, host, policy, status=None):
+        '''outcome of a request (after its last attempt): status None (no answer) or >= 500 is a failure'''
+        if status is None or status >= 500:
+            return self.failure(host, policy)
+        self.success(host)
+        return False
+
+    def _count(self, state, policy):
+        state[0] += 1
+        if state[0] >= policy['circuit_failures']:
+            state[1] = time.time() + policy['circuit_reset']
+            return True
+        return False
+
+    def success(self, host):
+        if not self.path:
+            with self.lock:
+                self.hosts.pop(host, None)
+            return
+        stateFile = self._stateFile(host)
+        if not os.path.exists(stateFile):
+            return
+        try:
+            with FileLock(stateFile + '.lock'):
+                os.remove(stateFile)
+        except EnvironmentError:
+            pass
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    prefetch of the data the user will likely ask next (next page, next episode...)
+    the plugin registers the calls with Prefetcher.register, a service runs Prefetcher.run
+    on an instance of the same class: the calls go through cacheable and warm SimpleCache
+    so the next click is served from the cache
+'''
+import os
+import json
+import time
+import heapq
+from .staticutils import FileLock
+
+
+class Prefetcher(object):
+
+    def __init__(self, path, rate=1.0, maxAge=600, maxQueue=100, log=None):
+        '''
+            path is a folder shared by the plugin and the service (ie the addon profile)
+            rate is the max number of calls per second, registered calls older than
+            maxAge seconds are dropped
+        '''
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.queueFile = os.path.join(path, 'prefetch.json')
+        self.lock = FileLock(self.queueFile + '.lock')
+        self.rate = rate
+        self.maxAge = maxAge
+        self.maxQueue = maxQueue
+        self.log = log or (lambda msg: None)
+        self._last = 0
+
+    @staticmethod
+    def createKey(method, args, kwargs):
+        return json.dumps([method, list(args), kwargs], sort_keys=True)
+
+    def _load(self):
+        try:
+            with open(self.queueFile, 'r') as fd:
+                queue = json.load(fd)
+        except (EnvironmentError, ValueError):
+            return []
+        limit = time.time() - self.maxAge
+        queue = [item for item in queue if item[1] > limit]
+        heapq.heapify(queue)
+        return queue
+
+    def _save(self, queue):
+        with open(self.queueFile, 'w') as fd:
+            json.dump(queue, fd)
+
+    def register(self, method, args=(), kwargs=None, priority=10):
+        '''
+            queues obj.method(*args, **kwargs) for the service, lower priority runs first
+            registering again the same call updates its priority
+        '''
+        kwargs = kwargs or {}
+        key = self.createKey(method, args, kwargs)
+        with self.lock:
+            queue = [item for item in self._load() if item[2] != key]
+            heapq.heapify(queue)
+            heapq.heappush(queue, [priority, time.time(), key, method, list(args), kwargs])
+            if len(queue) > self.maxQueue:
+                queue = heapq.nsmallest(self.maxQueue, queue)
+            self._save(queue)
+
+    def cancel(self, method=None, args=None, kwargs=None):
+        '''removes the matching calls, without arguments clears the queue'''
+        with self.lock:
+            if method is None:
+                queue = []
+            elif args is None:
+                queue = [item for item in self._load() if item[3] != method]
+            else:
+                key = self.createKey(method, args, kwargs or {})
+                queue = [item for item in self._load() if item[2] != key]
+            self._save(queue)
+
+    def pop(self):
+        with self.lock:
+            queue = self._load()
+            if not queue:
+                return None
+            item = heapq.heappop(queue)
+            self._save(queue)
+        return item[3], item[4], item[5]
+
+    def runOnce(self, target):
+        '''executes the first queued call on target, returns False if the queue is empty'''
+        call = self.pop()
+        if call is None:
+            return False
+        method, args, kwargs = call
+        wait = self._last + 1.0 / self.rate - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        self._last = time.time()
+        try:
+            getattr(target, method)(*args, **kwargs)
+            self.log("Prefetched %s%s" % (method, tuple(args)))
+        except Exception as ex:
+            self.log("Prefetch of %s failed: %s" % (method, ex))
+        return True
+
+    def run(self, target, monitor=None, idle=1.0):
+        '''
+            service loop, until monitor (ie xbmc.Monitor) asks to abort
+            without a monitor it returns when the queue is empty
+        '''
+        while monitor is None or not monitor.abortRequested():
+            if self.runOnce(target):
+                continue
+            if monitor is None or monitor.waitForAbort(idle):
+                break
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    per host token bucket shared by all the processes through a file locked state
+    plus an in process limit of the concurrent requests
+    limits are dicts like {'rate': 2, 'burst': 5, 'concurrency': 4}:
+    rate requests per second, up to burst requests at once after an idle period
+'''
+import os
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+from .staticutils import FileLock
+
+
+class RateLimiter(object):
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                pass
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def _stateFile(self, host):
+        return os.path.join(self.path, re.sub(r'[^a-z0-9.-]', '_', host.lower()) + '.json')
+
+    def _take(self, host, rate, burst):
+        '''takes a token, returns the seconds to wait if the bucket is empty'''
+        stateFile = self._stateFile(host)
+        with FileLock(stateFile + '.lock'):
+            now = time.time()
+            try:
+                with open(stateFile, 'r') as fd:
+                    state = json.load(fd)
+            except (EnvironmentError, ValueError):
+                state = {'tokens': burst, 'ts': now}
+            tokens = min(burst, state['tokens'] + max(now - state['ts'], 0) * rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            with open(stateFile, 'w') as fd:
+                json.dump({'tokens': tokens, 'ts': now}, fd)
+        return wait
+
+    def delay(self, host, limits):
+        '''takes a token if available, otherwise returns the seconds to wait before trying again'''
+        rate = float(limits.get('rate') or 0)
+        if rate <= 0:
+            return 0
+        burst = max(float(limits.get('burst') or 1), 1)
+        try:
+            return self._take(host, rate, burst)
+        except EnvironmentError:
+            # state not available, don't block the request
+            return 0
+
+    def wait(self, host, limits):
+        while True:
+            delay = self.delay(host, limits)
+            if not delay:
+                return
+            time.sleep(delay)
+
+    def _semaphore(self, host, concurrency):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(concurrency)
+            return self.semaphores[host]
+
+    @contextmanager
+    def slot(self, host, limits):
+        '''waits for a free connection and a token of host'''
+        semaphore = None
+        if limits.get('concurrency'):
+            semaphore = self._semaphore(host, int(limits['concurrency']))
+            semaphore.acquire()
+        try:
+            self.wait(host, limits)
+            yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    small local keep-alive relay
+    a long lived process (ie a kodi service) runs serve() and keeps pooled
+    connections to the upstream hosts, plugin invocations send their requests
+    to it through RUtils with USE_RELAY = True and skip the tcp/tls handshakes
+    cookies are not kept by the relay, addons relying on them should not use it
+'''
+import socket
+import threading
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from http.cookiejar import DefaultCookiePolicy
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from cookielib import DefaultCookiePolicy
+import requests
+from requests.adapters import HTTPAdapter
+
+RELAYHOST = '127.0.0.1'
+RELAYPORT = 52089
+URLHEADER = 'X-Relay-Url'
+TIMEOUTHEADER = 'X-Relay-Timeout'
+FINALURLHEADER = 'X-Relay-Final-Url'
+HOPHEADERS = ('connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'te', 'trailer',
+              'upgrade', 'host', 'content-length', 'content-encoding')
+# added again by the relay itself
+OWNHEADERS = ('server', 'date')
+
+
+def getRelayUrl(port=RELAYPORT):
+    return 'http://%s:%s/' % (RELAYHOST, port)
+
+
+def isRunning(port=RELAYPORT, timeout=0.05):
+    try:
+        sock = socket.create_connection((RELAYHOST, port), timeout)
+    except (socket.error, socket.timeout):
+        return False
+    sock.close()
+    return True
+
+
+class RelayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.forward('GET')
+
+    def do_POST(self):
+        self.forward('POST')
+
+    def forward(self, method):
+        target = self.headers.get(URLHEADER)
+        if not target:
+            self.reply(400, [], b'')
+            return
+        headers = dict((k, v) for k, v in self.headers.items()
+                       if k.lower() not in HOPHEADERS and not k.lower().startswith('x-relay-'))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        timeout = self.headers.get(TIMEOUTHEADER)
+        try:
+            r = self.server.session.request(method, target, headers=headers, data=body,
+                                            timeout=float(timeout) if timeout else None)
+        except requests.RequestException as ex:
+            self.reply(502, [], str(ex).encode('utf-8'))
+            return
+        replyHeaders = [(k, v) for k, v in r.headers.items() if k.lower() not in HOPHEADERS + OWNHEADERS]
+        replyHeaders.append((FINALURLHEADER, r.url))
+        self.reply(r.status_code, replyHeaders, r.content)
+
+    def reply(self, status, headers, body):
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RelayServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=RELAYPORT, poolsize=20):
+        HTTPServer.__init__(self, (RELAYHOST, port), RelayHandler)
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=poolsize, pool_maxsize=poolsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.session.close()
+
+
+def serve(port=RELAYPORT, monitor=None):
+    '''
+        runs the relay until the monitor (ie xbmc.Monitor) asks to abort
+        without a monitor it serves forever in the calling thread
+    '''
+    server = RelayServer(port)
+    if monitor is None:
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        return
+    server.start()
+    while not monitor.abortRequested():
+        if monitor.waitForAbort(1):
+            break
+    server.stop()
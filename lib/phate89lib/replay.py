@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    record/replay transport for requests sessions (ie RUtils.SESSION), for offline tests and benchmarks
+        replay.install(RUtils.SESSION, '/path/fixtures', 'record')   # saves the real responses
+        replay.install(RUtils.SESSION, '/path/fixtures', 'replay', latency=0.05)
+    modes: record always goes to the network, replay only uses the fixtures (a missing
+    one is a ConnectionError), auto replays the fixtures it has and records the others
+    every fixture is a json metadata file plus the body, named by the hash of the request
+'''
+import io
+import os
+import json
+import time
+import hashlib
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+try:
+    from http.client import responses
+except ImportError:
+    from httplib import responses
+from .httpcache import DROPHEADERS
+
+MODES = ('record', 'replay', 'auto')
+
+
+def createKey(method, url, body=None):
+    raw = u'%s %s' % (method.upper(), url)
+    digest = hashlib.sha1(raw.encode('utf-8'))
+    if body:
+        digest.update(body if isinstance(body, bytes) else body.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def addFixture(path, method, url, body=b'', status=200, headers=None, requestBody=None):
+    '''writes a fixture without a real request, ie for generated test data'''
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    key = createKey(method, url, requestBody)
+    meta = {'method': method.upper(), 'url': url, 'status': status, 'headers': headers or {}}
+    with open(os.path.join(path, key + '.body'), 'wb') as fd:
+        fd.write(body)
+    with open(os.path.join(path, key + '.json'), 'w') as fd:
+        json.dump(meta, fd, indent=1, sort_keys=True)
+    return key
+
+
+def install(session, path, mode='replay', latency=0, bandwidth=0):
+    '''mounts a ReplayAdapter on session for http and https, returns it'''
+    adapter = ReplayAdapter(path, mode, latency, bandwidth)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return adapter
+
+
+class ReplayAdapter(BaseAdapter):
+    '''
+        latency is the seconds added before every replayed response,
+        bandwidth (bytes per second, 0 unlimited) adds the body download time
+    '''
+
+    def __init__(self, path, mode='replay', latency=0, bandwidth=0):
+        if mode not in MODES:
+            raise ValueError('mode must be one of %s' % (MODES,))
+        super(ReplayAdapter, self).__init__()
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.real = None
+        self.recorded = 0
+        self.replayed = 0
+        if mode != 'replay' and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _files(self, key):
+        return os.path.join(self.path, key + '.json'), os.path.join(self.path, key + '.body')
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = createKey(request.method, request.url, request.body)
+        metaFile, bodyFile = self._files(key)
+        if self.mode == 'record' or (self.mode == 'auto' and not os.path.exists(metaFile)):
+            return self._record(key, request, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        try:
+            with open(metaFile, 'r') as fd:
+                meta = json.load(fd)
+            with open(bodyFile, 'rb') as fd:
+                body = fd.read()
+        except (EnvironmentError, ValueError):
+            raise requests.ConnectionError('no fixture for %s %s' % (request.method, request.url), request=request)
+        delay = self.latency
+        if self.bandwidth:
+            delay += float(len(body)) / self.bandwidth
+        if delay:
+            time.sleep(delay)
+        self.replayed += 1
+        return self.buildResponse(request, meta, body)
+
+    def _record(self, key, request, **kwargs):
+        if self.real is None:
+            self.real = HTTPAdapter()
+        r = self.real.send(request, stream=False, **kwargs)
+        body = r.content
+        meta = {
+            'method': request.method,
+            'url': request.url,
+            'status': r.status_code,
+            'headers': dict((k, v) for k, v in r.headers.items() if k.lower() not in DROPHEADERS),
+        }
+        metaFile, bodyFile = self._files(key)
+        with open(bodyFile, 'wb') as fd:
+            fd.write(body)
+        with open(metaFile, 'w') as fd:
+            json.dump(meta, fd, indent=1, sort_keys=True)
+        self.recorded += 1
+        return self.buildResponse(request, meta, body)
+
+    def buildResponse(self, request, meta, body):
+        r = requests.Response()
+        r.status_code = meta['status']
+        r.headers = CaseInsensitiveDict(meta.get('headers', {}))
+        r.headers['Content-Length'] = str(len(body))
+        r.encoding = get_encoding_from_headers(r.headers)
+        # a file object, so the streamed downloads (iter_content) work too
+        r.raw = io.BytesIO(body)
+        r.reason = responses.get(r.status_code, '')
+        r.url = request.url
+        r.request = request
+        r.connection = self
+        return r
+
+    def close(self):
+        if self.real is not None:
+            self.real.close()
@@ -1,31 +1,139 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import codecs
 import json
 import os
 import shutil
+import tempfile
+import threading
+import time
 import zipfile
-import requests
-import simplecache
-from bs4 import BeautifulSoup
 from . import staticutils
+from . import archiveutils
+from . import jsonutils
+from . import policy
+from .ratelimit import RateLimiter
+from .instrument import METRICS
+from .httpcache import HttpCache
 try:
     from json.decoder import JSONDecodeError
 except ImportError:
     JSONDecodeError = ValueError
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+# getSoup arguments given to createRequest (requests options), the others go to BeautifulSoup
+REQUESTARGS = ('addDefault', 'headers', 'cookies', 'files', 'auth', 'timeout', 'allow_redirects',
+               'proxies', 'hooks', 'verify', 'cert', 'json')
+
+
+def splitRequestArgs(kwargs):
+    '''returns (createRequest arguments, BeautifulSoup arguments) of the getSoup kwargs'''
+    requestArgs = dict((k, v) for k, v in kwargs.items() if k in REQUESTARGS)
+    soupArgs = dict((k, v) for k, v in kwargs.items() if k not in REQUESTARGS)
+    return requestArgs, soupArgs
+_FASTESTPARSER = []
+
+
+def getFastestParser():
+    '''lxml when installed, html5lib is more lenient but slower than the builtin parser'''
+    if not _FASTESTPARSER:
+        try:
+            import lxml  # noqa: F401
+            _FASTESTPARSER.append('lxml')
+        except ImportError:
+            _FASTESTPARSER.append('html.parser')
+    return _FASTESTPARSER[0]
+
+
+class _NoLimit(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NOLIMIT = _NoLimit()
+
+
+class _LazySession(object):
+    '''class level requests session created on first use, so importing rutils doesn't load requests'''
+
+    def __init__(self):
+        self.session = None
+
+    def __get__(self, instance, owner):
+        if self.session is None:
+            import requests
+            self.session = requests.Session()
+        return self.session
+
+
+def _defaultDataPath():
+    '''profile of the running addon, a temp folder outside kodi'''
+    try:
+        from . import kodiutils
+        path = kodiutils.getConst('DATA_PATH_T')
+        if path:
+            return path
+    except Exception:
+        # no kodi_six or no running addon
+        pass
+    return os.path.join(tempfile.gettempdir(), 'phate89lib')
 
 
 class RUtils(object):
-    SESSION = requests.Session()
+    SESSION = _LazySession()
     USERAGENT = 'phate89 utility module'
     DEFPARAMS = {}
     LOGLEVEL = 5
+    MAXWORKERS = 8
+    SPOOLSIZE = 4 * 1024 * 1024
+    USE_RELAY = False
+    # None is the relay module default port
+    RELAYPORT = None
+    # per host overrides of policy.DEFPOLICY, ie {'api.example.com': {'retries': 4}}
+    POLICIES = {}
+    DEFPOLICY = policy.DEFPOLICY
+    # None keeps the circuits in data_path, shared by all the invocations, or a policy.CircuitBreaker
+    CIRCUITS = None
+    # per host traffic shaping, ie {'api.example.com': {'rate': 2, 'burst': 5, 'concurrency': 4}}
+    # the '*' key applies to the hosts not listed
+    RATELIMITS = {}
+    _limiters = {}
+    _circuits = {}
+    httpcache = None
+    _relayDown = False
 
-    def __init__(self, enable_cache=False, enable_mem_cache=False, global_ignore_cache=False):
+    def __init__(self, enable_cache=False, enable_mem_cache=False, global_ignore_cache=False,
+                 enable_http_cache=False, data_path=''):
         self.setUserAgent(self.USERAGENT)
+        self._dataPath = data_path
         if enable_cache:
+            import simplecache
             self.cache = simplecache.SimpleCache()
             self.cache.enable_mem_cache = enable_mem_cache
             self.ignore_cache = global_ignore_cache
+        if enable_http_cache:
+            self.httpcache = HttpCache(os.path.join(self.data_path, 'httpcache'))
+
+    @property
+    def data_path(self):
+        '''folder of the http cache, rate limits and circuits, the addon profile by default'''
+        if not self._dataPath:
+            self._dataPath = _defaultDataPath()
+        return self._dataPath
+
+    @data_path.setter
+    def data_path(self, value):
+        self._dataPath = value
 
     def setUserAgent(self, useragent):
         self.setHeader('user-agent', useragent)
@@ -42,11 +150,51 @@ class RUtils(object):
             params = {}
         if addDefault:
             params.update(self.DEFPARAMS)
-        if post is not None:
-            r = self.SESSION.post(url, params=params, data=post, stream=stream, **kwargs)
-        else:
-            r = self.SESSION.get(url, params=params, stream=stream, **kwargs)
+        key = entry = None
+        if self.httpcache is not None and post is None and not stream:
+            key, entry, cached = self._fromHttpCache(url, params, kwargs)
+            if cached is not None:
+                return cached
+        start = time.time()
+        r = self._sendWithPolicy(url, params, post, stream, **kwargs)
+        if METRICS.enabled:
+            self._recordRequest(url, r, start, stream)
+        if r is None:
+            return False
+        return self._checkResponse(r, key, entry)
+
+    def _fromHttpCache(self, url, params, kwargs):
+        '''
+            returns (key, entry, response): response is the cached one if still fresh,
+            otherwise the validators of the stale entry are added to the request headers
+        '''
+        key = HttpCache.createKey('GET', url, params)
+        entry = self.httpcache.get(key)
+        if self.httpcache.isFresh(entry):
+            r = self.httpcache.buildResponse(key, entry)
+            if r is not None:
+                self.log("Opening url %s (from cache)" % r.url, 2)
+                METRICS.record('request', urlparse(url).netloc, url=r.url, status=r.status_code,
+                               cache='fresh', ms=0)
+                return key, entry, r
+        validators = self.httpcache.getValidators(entry)
+        if validators:
+            headers = dict(kwargs.get('headers') or {})
+            headers.update(validators)
+            kwargs['headers'] = headers
+        return key, entry, None
+
+    def _checkResponse(self, r, key=None, entry=None):
+        '''updates the http cache (key is None if not used), returns r or False on errors'''
         self.log("Opening url %s" % r.url, 2)
+        if key is not None:
+            if r.status_code == 304 and entry is not None:
+                self.httpcache.refresh(key, entry, r)
+                cached = self.httpcache.buildResponse(key, entry)
+                if cached is not None:
+                    return cached
+            elif r.status_code == 200:
+                self.httpcache.set(key, r)
         if r.ok:
             return r
         if r.status_code < 500:
@@ -55,29 +203,245 @@ class RUtils(object):
             self.log("Error opening url. Server error")
         return False
 
+    def _recordRequest(self, url, r, start, stream):
+        '''
+            requests doesn't expose the dns and connect times: ttfb is the time until
+            the headers are parsed (connection included), download the rest
+        '''
+        total = (time.time() - start) * 1000
+        if r is None:
+            METRICS.record('request', urlparse(url).netloc, url=url, status=None, ms=total)
+            return
+        ttfb = r.elapsed.total_seconds() * 1000
+        METRICS.record('request', urlparse(url).netloc, url=r.url, status=r.status_code, ms=total,
+                       ttfb_ms=ttfb, download_ms=None if stream else max(total - ttfb, 0),
+                       bytes=None if stream else len(r.content), cache=None)
+
+    def _sendWithPolicy(self, url, params, post, stream, **kwargs):
+        '''
+            sends the request with the timeouts, retries and circuit breaker of the host policy
+            returns None if the host can't be reached
+        '''
+        import requests
+        host = urlparse(url).netloc
+        hostPolicy = policy.getPolicy(self.POLICIES, host, self.DEFPOLICY)
+        circuits = self._circuitBreaker()
+        if circuits.isOpen(host):
+            self.log("Error opening url %s. Too many failures, host skipped" % url)
+            return None
+        kwargs.setdefault('timeout', (hostPolicy['connect_timeout'], hostPolicy['read_timeout']))
+        attempts = policy.attempts(hostPolicy, post)
+        for attempt in range(attempts):
+            last = attempt + 1 >= attempts
+            try:
+                with self._rateSlot(host):
+                    r = self._send(url, params, post, stream, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                if last:
+                    # one outcome per request, whatever the attempts
+                    circuits.record(host, hostPolicy)
+                    self.log("Error opening url %s: %s" % (url, ex))
+                    return None
+                self.log("Error opening url %s, retrying: %s" % (url, ex), 4)
+                time.sleep(policy.backoffDelay(hostPolicy, attempt))
+                continue
+            delay = policy.retryDelay(hostPolicy, r, attempt, last)
+            if delay is None:
+                circuits.record(host, hostPolicy, r.status_code)
+                return r
+            self.log("Error opening url %s (%s), retrying in %.1fs" % (url, r.status_code, delay), 4)
+            r.close()
+            time.sleep(delay)
+
+    def _circuitBreaker(self):
+        if self.CIRCUITS is not None:
+            return self.CIRCUITS
+        path = os.path.join(self.data_path, 'circuits')
+        if path not in RUtils._circuits:
+            RUtils._circuits[path] = policy.CircuitBreaker(path)
+        return RUtils._circuits[path]
+
+    def _rateLimits(self, host):
+        return self.RATELIMITS.get(host, self.RATELIMITS.get('*'))
+
+    def _rateLimiter(self):
+        path = os.path.join(self.data_path, 'ratelimit')
+        if path not in RUtils._limiters:
+            RUtils._limiters[path] = RateLimiter(path)
+        return RUtils._limiters[path]
+
+    def _rateSlot(self, host):
+        limits = self._rateLimits(host)
+        if not limits:
+            return _NOLIMIT
+        return self._rateLimiter().slot(host, limits)
+
+    def _send(self, url, params, post, stream, **kwargs):
+        if self.USE_RELAY and not stream and not RUtils._relayDown:
+            r = self._sendRelay(url, params, post, **kwargs)
+            if r is not None:
+                return r
+        if post is not None:
+            return self.SESSION.post(url, params=params, data=post, stream=stream, **kwargs)
+        return self.SESSION.get(url, params=params, stream=stream, **kwargs)
+
+    def _sendRelay(self, url, params, post, headers=None, timeout=None, **kwargs):
+        if kwargs:
+            # options the relay can't forward, go direct
+            return None
+        import requests
+        from . import relay
+        method = 'GET' if post is None else 'POST'
+        req = self.SESSION.prepare_request(requests.Request(method, url, params=params, data=post, headers=headers))
+        relayHeaders = dict(req.headers)
+        relayHeaders[relay.URLHEADER] = req.url
+        if timeout:
+            relayHeaders[relay.TIMEOUTHEADER] = str(timeout[1] if isinstance(timeout, tuple) else timeout)
+        try:
+            r = self.SESSION.request(method, relay.getRelayUrl(self.RELAYPORT or relay.RELAYPORT), data=req.body,
+                                     headers=relayHeaders, allow_redirects=False, timeout=timeout)
+        except requests.ConnectionError:
+            self.log("Relay not running, using direct connection", 4)
+            RUtils._relayDown = True
+            return None
+        if r.status_code == 502 and relay.FINALURLHEADER not in r.headers:
+            self.log("Relay error, using direct connection: %s" % r.text, 4)
+            return None
+        r.url = r.headers.get(relay.FINALURLHEADER, req.url)
+        return r
+
     def newSession(self):
+        import requests
         self.SESSION = requests.Session()
         self.setUserAgent(self.USERAGENT)
 
     def getJson(self, url, params=None, post=None, **kwargs):
+        import requests
         r = self.createRequest(url, params, post, **kwargs)
         if r:
             try:
-                return r.json()
-            except (requests.HTTPError, JSONDecodeError):
+                with METRICS.timer('parse', 'json', url=r.url):
+                    return self.decodeJson(r)
+            except (requests.HTTPError, JSONDecodeError, ValueError):
                 self.log("Error serializing json")
         return None
 
-    def getSoup(self, url, params=None, post=None, parser="html.parser", **kwargs):
-        r = self.createRequest(url, params, post)
+    def decodeJson(self, res):
+        contentType = res.headers.get('content-type', '').lower()
+        if 'charset' in contentType and 'utf-8' not in contentType:
+            return jsonutils.loads(res.text)
+        content = res.content
+        if content.startswith(codecs.BOM_UTF8):
+            content = content[len(codecs.BOM_UTF8):]
+        try:
+            return jsonutils.loads(content)
+        except ValueError:
+            # utf-16/32 bodies
+            return res.json()
+
+    def getJsonStream(self, url, path='item', params=None, post=None, **kwargs):
+        '''
+            yields the values at path (ijson syntax, ie "item" or "data.shows.item")
+            while the response downloads, nothing is yielded if the request fails
+        '''
+        r = self.createRequest(url, params, post, stream=True, **kwargs)
+        if not r:
+            return
+        try:
+            for item in jsonutils.iterItems(r, path):
+                yield item
+        except ValueError:
+            self.log("Error serializing json")
+        finally:
+            r.close()
+
+    def getSoup(self, url, params=None, post=None, parser="html.parser", strainer=None, **kwargs):
+        '''
+            parser "auto" picks the fastest parser installed, strainer (a SoupStrainer, a tag
+            name or a dict of SoupStrainer arguments) parses only the matching part of the page
+            requests options in kwargs (REQUESTARGS) are given to createRequest, the others
+            to BeautifulSoup
+        '''
+        requestArgs, soupArgs = splitRequestArgs(kwargs)
+        r = self.createRequest(url, params, post, **requestArgs)
         if r:
-            return BeautifulSoup(r.text, parser, **kwargs)
+            return self.getSoupFromRes(r, parser, strainer, **soupArgs)
         return False
 
-    def getSoupFromRes(self, res, parser="html.parser", **kwargs):
-        if res:
-            return BeautifulSoup(res.text, parser, **kwargs)
-        return False
+    def getJsonMany(self, requests_list, workers=None, **kwargs):
+        '''
+            runs getJson for every (url, params, post) item of requests_list concurrently
+            results are returned in input order, failed requests are None
+        '''
+        return self._runMany(self.getJson, requests_list, None, workers, **kwargs)
+
+    def getSoupMany(self, requests_list, workers=None, **kwargs):
+        '''
+            runs getSoup for every (url, params, post) item of requests_list concurrently
+            results are returned in input order, failed requests are False
+        '''
+        return self._runMany(self.getSoup, requests_list, False, workers, **kwargs)
+
+    def getTextMany(self, requests_list, workers=None, **kwargs):
+        '''
+            runs getText for every (url, params, post) item of requests_list concurrently
+            results are returned in input order, failed requests are False
+        '''
+        return self._runMany(self.getText, requests_list, False, workers, **kwargs)
+
+    def _runMany(self, func, requests_list, failValue, workers=None, **kwargs):
+        requests_list = list(requests_list)
+        results = [failValue] * len(requests_list)
+        queue = Queue()
+        for index, item in enumerate(requests_list):
+            if not isinstance(item, (tuple, list)):
+                item = (item,)
+            queue.put((index, item))
+
+        def worker():
+            while True:
+                try:
+                    index, item = queue.get_nowait()
+                except Empty:
+                    return
+                try:
+                    results[index] = func(*item, **kwargs)
+                except Exception as ex:
+                    self.log("Error opening url %s: %s" % (item[0], ex))
+
+        workers = min(workers or self.MAXWORKERS, len(requests_list))
+        if workers <= 1:
+            worker()
+            return results
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def getSoupFromRes(self, res, parser="html.parser", strainer=None, **kwargs):
+        if not res:
+            return False
+        from bs4 import BeautifulSoup, SoupStrainer
+        if parser == 'auto':
+            parser = getFastestParser()
+        if strainer is not None and 'parse_only' not in kwargs:
+            if isinstance(strainer, dict):
+                strainer = SoupStrainer(**strainer)
+            elif not isinstance(strainer, SoupStrainer):
+                strainer = SoupStrainer(strainer)
+            kwargs['parse_only'] = strainer
+        # give the raw bytes and the declared encoding, BeautifulSoup sniffs it otherwise
+        if 'from_encoding' not in kwargs and 'charset' in res.headers.get('content-type', '').lower():
+            kwargs['from_encoding'] = res.encoding
+        start = time.time()
+        soup = BeautifulSoup(res.content, parser, **kwargs)
+        elapsed = (time.time() - start) * 1000
+        self.log("Parsed %s with %s in %.1f ms" % (res.url, parser, elapsed), 4)
+        METRICS.record('parse', 'soup', url=res.url, parser=parser, ms=elapsed)
+        return soup
 
     def getText(self, url, params=None, post=None, **kwargs):
         r = self.createRequest(url, params, post, **kwargs)
@@ -93,74 +457,65 @@ class RUtils(object):
             self.log(url + " file read failed", 4)
             return False
 
+        import requests
         if os.path.isdir(dataPath):
             shutil.rmtree(dataPath)
         os.makedirs(dataPath)
-        chunk = ''
-        for chunk in data.iter_content(1):
-            ext = 'srt'
-            if chunk == 'P':
-                ext = 'zip'
-            elif chunk == 'R':
-                ext = 'rar'
-            break
-
-        TEMPFILE = os.path.join(dataPath, 'itasa.' + ext)
-        if os.path.exists(TEMPFILE):
-            os.remove(TEMPFILE)
+        # small archives stay in memory, bigger ones roll over to a temp file
+        buf = tempfile.SpooledTemporaryFile(max_size=self.SPOOLSIZE, dir=dataPath)
         try:
-            with open(TEMPFILE, 'wb') as fd:
-                fd.write(chunk)
-                for chunk in data.iter_content(chunk_size=1024):
-                    fd.write(chunk)
-        except EnvironmentError:
-            self.log("Error writing file")
-            return False
-
-        if ext == 'srt':
-            outName = TEMPFILE
-            index = 0
-        elif ext == 'zip':
-            zf = zipfile.ZipFile(TEMPFILE, 'r')
-            exts = ['.srt', '.sub', '.txt', '.smi', '.ssa', '.ass']
-            subs = [x for x in zf.namelist() if os.path.splitext(x)[1] in exts]
-            if index >= len(subs):
-                index = 0
-            binData = zf.read(subs[index])
-            zf.close()
-            outName = os.path.join(dataPath, subs[index])
-
-            if binData:
-                try:
-                    with open(outName, 'wb') as fp:
-                        fp.write(binData)
-                        fp.close()
-                except EnvironmentError:
-                    self.log("Error writing text subtitle file")
-                    return False
-            else:
-                self.log('subtitle not found in zip file', 1)
-                fp.close()
-                return False
-        elif ext == 'rar':
             try:
-                from kodi_six import xbmc
-            except ImportError:
-                self.log('rar extraction not supported', 1)
-                return False
-            TEMPFOLDER = os.path.join(dataPath, 'temp', '')
-            if os.path.isdir(TEMPFOLDER):
-                shutil.rmtree(TEMPFOLDER)
-            os.makedirs(TEMPFOLDER)
-            xbmc.executebuiltin('Extract(%s,%s)' % (TEMPFILE, TEMPFOLDER), True)
-            exts = ['.srt', '.sub', '.txt', '.smi', '.ssa', '.ass']
-            subs = [os.path.join(root, name)
-                    for root, dirs, files in os.walk(TEMPFOLDER)
-                    for name in files
-                    if os.path.splitext(name)[1] in exts]
-            if not subs:
+                for chunk in data.iter_content(chunk_size=archiveutils.CHUNKSIZE):
+                    buf.write(chunk)
+            except (requests.RequestException, EnvironmentError):
+                self.log("Error downloading file")
                 return False
-            if index >= len(subs):
-                index = 0
-            outName = subs[0]
-        return index, outName
+            buf.seek(0)
+            ext = archiveutils.sniffArchive(buf.read(archiveutils.MAGICSIZE))
+            buf.seek(0)
+            return self._extract(buf, ext, data.url, dataPath, index)
+        finally:
+            buf.close()
+
+    def _extract(self, buf, ext, url, dataPath, index):
+        try:
+            if ext == 'srt':
+                return 0, archiveutils.copyTo(buf, os.path.join(dataPath, 'itasa.srt'))
+            if ext == 'gz':
+                return archiveutils.extractGzip(buf, dataPath, url.split('?')[0])
+            if ext == 'zip':
+                res = archiveutils.extractZip(buf, dataPath, index)
+                if not res:
+                    self.log('subtitle not found in zip file', 1)
+                    return False
+                return res
+            extractor = archiveutils.getExtractor(ext)
+            if extractor:
+                try:
+                    res = extractor(buf, dataPath, index)
+                    if not res:
+                        self.log('subtitle not found in %s file' % ext, 1)
+                        return False
+                    return res
+                except archiveutils.BackendError as ex:
+                    self.log("%s backend failed, trying kodi: %s" % (ext, ex), 4)
+                    buf.seek(0)
+            TEMPFILE = archiveutils.copyTo(buf, os.path.join(dataPath, 'itasa.' + ext))
+        except (EnvironmentError, zipfile.BadZipfile) as ex:
+            self.log("Error extracting subtitle file: %s" % ex)
+            return False
+        try:
+            from kodi_six import xbmc
+        except ImportError:
+            self.log('%s extraction not supported' % ext, 1)
+            return False
+        TEMPFOLDER = os.path.join(dataPath, 'temp', '')
+        if os.path.isdir(TEMPFOLDER):
+            shutil.rmtree(TEMPFOLDER)
+        os.makedirs(TEMPFOLDER)
+        xbmc.executebuiltin('Extract(%s,%s)' % (TEMPFILE, TEMPFOLDER), True)
+        subs = archiveutils.findSubtitles(TEMPFOLDER)
+        if not subs:
+            return False
+        index = archiveutils.pickIndex(subs, index)
+        return index, subs[index]
@@ -5,12 +5,14 @@ try:
 except ImportError:
     from urllib import urlencode
     from urlparse import parse_qsl
+import os
 import sys
+import errno
 import re
 import unicodedata
+from collections import namedtuple
 from datetime import datetime
 import time
-from kodi_six import utils  # pyright: reportMissingImports=false
 
 PY2 = sys.version_info[0] == 2
 
@@ -31,28 +33,49 @@ def normalizeString(s):
     return unicodedata.normalize('NFKD', s).encode('ascii', 'ignore')
 
 
+# (token, quality) from the lowest to the highest priority, the highest found wins
+# "720p" alone was always overridden by "hdtv" so it's not a rule anymore
+QUALITY_RULES = (
+    (r'web[-. ]?dl', 'web-dl'),
+    (r'bdrip', 'bdrip'),
+    (r'bluray', 'bluray'),
+    (r'1080i', '1080i'),
+    (r'1080p', '1080p'),
+    (r'hdtv', 'normale'),
+    (r'(?<![a-z0-9])hr(?![a-z0-9])', 'hr'),
+)
+# (token, source) from the lowest to the highest priority
+SOURCE_RULES = (
+    (r'dvdrip', 'dvdrip'),
+    (r'hdtv', 'hdtv'),
+    (r'web[-. ]?rip', 'webrip'),
+    (r'web[-. ]?dl', 'web-dl'),
+    (r'bdrip', 'bdrip'),
+    (r'blu[-. ]?ray', 'bluray'),
+)
+
+
+def _compileRules(rules):
+    return re.compile('|'.join('(?P<R%d>%s)' % (i, rule) for i, (rule, _) in enumerate(rules)), re.IGNORECASE)
+
+
+RE_QUALITY = _compileRules(QUALITY_RULES)
+RE_SOURCE = _compileRules(SOURCE_RULES)
+
+
+def _bestRule(regex, rules, name):
+    best = -1
+    for m in regex.finditer(name):
+        best = max(best, int(m.lastgroup[1:]))
+    return rules[best][1] if best >= 0 else ""
+
+
 def guessQuality(sFileName):
-    fl = sFileName.lower()
-    res = ""
-    if ('web-dl' in fl) or ('web.dl' in fl) or ('webdl' in fl) or ('web dl' in fl):
-        res = "web-dl"
-    if ('720p' in fl) and ('hdtv' in fl):
-        res = "720p"
-    if ('bdrip' in fl):
-        res = "bdrip"
-    if ('bdrip' in fl):
-        res = "bdrip"
-    if ('bluray' in fl):
-        res = "bluray"
-    if ('1080i' in fl):
-        res = "1080i"
-    if ('1080p' in fl):
-        res = "1080p"
-    if ('hdtv' in fl):
-        res = "normale"
-    if ('hr' in fl):
-        res = "hr"
-    return res
+    return _bestRule(RE_QUALITY, QUALITY_RULES, sFileName)
+
+
+def guessSource(sFileName):
+    return _bestRule(RE_SOURCE, SOURCE_RULES, sFileName)
 
 
 def createMenu(items, dflt):
@@ -63,29 +86,58 @@ def createMenu(items, dflt):
         dflt()
 
 
-def parseFileName(filename):
+# (show and season part, has season) tried in order, followed by the episode number
+EPISODE_RULES = (
+    (r'(?P<NOME{0}>.*[^ _.-])[ _.-]+s(?P<STAGIONE{0}>[0-9]+)[ ._-]*e', True),
+    (r'(?P<NOME{0}>.*[^ _.-])[ _.-]+(?P<STAGIONE{0}>[0-9]+)x', True),
+    (r'(?P<NOME{0}>.*[^ _.-])[ _.-]+e(?:p[ ._-]?)?', False),
+)
+EPISODE_NUMBER = r'(?P<EPISODIO{0}>[0-9]+)(?:(?:[a-i]|\.[1-9])(?![0-9]))?'
+RE_EPISODE = re.compile('|'.join(('(?:' + rule + EPISODE_NUMBER + ')').format(i)
+                                 for i, (rule, _) in enumerate(EPISODE_RULES)), re.IGNORECASE)
+RE_SEPARATORS = re.compile(r'[ _.-]+')
+RE_EXTENSION = re.compile(r'\.(?:mkv|mp4|avi|m4v|ts|wmv|srt|sub|ass|ssa|smi|txt|zip|rar)$', re.IGNORECASE)
+RE_GROUP = re.compile(r'-(?P<GROUP>[a-z0-9]+)(?:\[[^]]*\])?$', re.IGNORECASE)
+# tails of quality tokens (WEB-DL, WEB-RIP, BLU-RAY) that look like a release group
+NOTGROUPS = ('dl', 'rip', 'ray')
+
+ParsedName = namedtuple('ParsedName', 'show season episode quality source group')
+_PARSECACHE = {}
+PARSECACHESIZE = 10000
+
+
+def parse_name(filename):
+    '''parses a release name in a ParsedName, show season and episode are empty if not found'''
     tvshow = episode = season = ''
-    reStrings = [
-        (r'(?P<NOME>.*[^ _.-])[ _.-]+s(?P<STAGIONE>[0-9]+)[ ._-]*'
-         r'e(?P<EPISODIO>[0-9]+(?:(?:[a-i]|\.[1-9])(?![0-9]))?)'),
-        (r'(?P<NOME>.*[^ _.-])[ _.-]+(?P<STAGIONE>[0-9]+)x'
-         r'(?P<EPISODIO>[0-9]+(?:(?:[a-i]|\.[1-9])(?![0-9]))?)'),
-        (r'(?P<NOME>.*[^ _.-])[ _.-]+e(?:p[ ._-]?)?'
-         r'(?P<EPISODIO>[0-9]+(?:(?:[a-i]|\.[1-9])(?![0-9]))?)')
-    ]
-    for rg in reStrings:
-        p = re.search(rg, filename, re.IGNORECASE)
-        if p:
-            break
+    name = RE_EXTENSION.sub('', filename)
+    p = RE_EPISODE.search(name)
     if p:
-        tvshow = p.group('NOME').replace(".", " ").replace(
-            "_", " ").replace("-", " ").replace("  ", " ").strip()
-        episode = int(p.group('EPISODIO'))
-        if len(p.groups()) > 2:
-            season = int(p.group('STAGIONE'))
-        else:
-            season = 1
-    return tvshow, season, episode
+        rule = p.lastgroup[len('EPISODIO'):]
+        tvshow = RE_SEPARATORS.sub(' ', p.group('NOME' + rule)).strip()
+        episode = int(p.group('EPISODIO' + rule))
+        season = int(p.group('STAGIONE' + rule)) if EPISODE_RULES[int(rule)][1] else 1
+    g = RE_GROUP.search(name)
+    group = g.group('GROUP').lower() if g else ''
+    return ParsedName(tvshow, season, episode, guessQuality(name), guessSource(name),
+                      group if group not in NOTGROUPS else '')
+
+
+def parse_many(filenames):
+    '''parse_name on a list of names, repeated names are parsed once'''
+    if len(_PARSECACHE) > PARSECACHESIZE:
+        _PARSECACHE.clear()
+    res = []
+    for filename in filenames:
+        parsed = _PARSECACHE.get(filename)
+        if parsed is None:
+            parsed = _PARSECACHE[filename] = parse_name(filename)
+        res.append(parsed)
+    return res
+
+
+def parseFileName(filename):
+    p = parse_name(filename)
+    return p.show, p.season, p.episode
 
 
 def get_timestamp(dt=None):
@@ -104,7 +156,59 @@ def get_date_from_timestamp(dt):
     return datetime.fromtimestamp(dt / 1e3)
 
 def py2_encode(*args, **kwargs):
+    from kodi_six import utils  # pyright: reportMissingImports=false
     return utils.py2_encode(*args, **kwargs)
 
 def py2_decode(*args, **kwargs):
+    from kodi_six import utils  # pyright: reportMissingImports=false
     return utils.py2_decode(*args, **kwargs)
+
+
+class FileLock(object):
+    '''
+        cross process lock based on the atomic creation of a lock file
+        a lock older than stale seconds is considered left by a dead process
+    '''
+
+    def __init__(self, path, timeout=10, stale=30):
+        self.path = path
+        self.timeout = timeout
+        self.stale = stale
+        self.fd = None
+
+    def acquire(self):
+        end = time.time() + self.timeout
+        while True:
+            try:
+                self.fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                return True
+            except OSError as ex:
+                if ex.errno != errno.EEXIST:
+                    raise
+            try:
+                if time.time() - os.path.getmtime(self.path) > self.stale:
+                    os.remove(self.path)
+                    continue
+            except OSError:
+                # released meanwhile
+                continue
+            if time.time() > end:
+                return False
+            time.sleep(0.01)
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        if not self.acquire():
+            raise IOError("Timeout acquiring lock %s" % self.path)
+        return self
+
+    def __exit__(self, *args):
+        self.release()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+    ranks the candidate subtitle release names against the playing episode
+    candidates are tokenised once and kept in an inverted index (token -> candidates)
+    so ranking only touches the candidates sharing something with the episode
+'''
+import re
+import math
+from collections import defaultdict, namedtuple
+from . import staticutils
+
+RE_TOKENS = re.compile(r'[a-z0-9]+')
+WEIGHTS = {
+    'tokens': 2.0,
+    'show': 4.0,
+    'season': 2.0,
+    'episode': 3.0,
+    'quality': 1.0,
+    'source': 1.0,
+    'group': 2.0,
+}
+
+RankedSubtitle = namedtuple('RankedSubtitle', 'name score sync parsed data')
+
+
+def tokenize(name):
+    return frozenset(RE_TOKENS.findall(name.lower()))
+
+
+def toInt(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return ''
+
+
+class SubtitleRanker(object):
+
+    def __init__(self, candidates, weights=None):
+        '''candidates is a list of release names or of (release name, data) pairs'''
+        self.weights = dict(WEIGHTS, **(weights or {}))
+        self.names = []
+        self.data = []
+        for candidate in candidates:
+            if isinstance(candidate, (tuple, list)):
+                self.names.append(candidate[0])
+                self.data.append(candidate[1])
+            else:
+                self.names.append(candidate)
+                self.data.append(None)
+        self.parsed = staticutils.parse_many(self.names)
+        self.showTokens = [tokenize(p.show) for p in self.parsed]
+        self.index = defaultdict(set)
+        self.episodes = defaultdict(set)
+        for i, name in enumerate(self.names):
+            for token in tokenize(name):
+                self.index[token].add(i)
+            self.episodes[(self.parsed[i].season, self.parsed[i].episode)].add(i)
+
+    def _idf(self, token):
+        return math.log(1.0 + float(len(self.names)) / len(self.index[token]))
+
+    def rank(self, episode):
+        '''
+            episode is a dict like kodiutils.getEpisodeInfo (tvshow, season, episode, filename)
+            returns a list of RankedSubtitle, best first, the candidates sharing
+            nothing with the episode are at the end with score 0
+        '''
+        filename = episode.get('filename') or ''
+        target = staticutils.parse_name(filename)
+        show = episode.get('tvshow') or target.show
+        if isinstance(show, bytes):
+            # kodiutils.normalizeString gives ascii bytes
+            show = show.decode('ascii', 'ignore')
+        season = toInt(episode.get('season'))
+        season = target.season if season == '' else season
+        number = toInt(episode.get('episode'))
+        number = target.episode if number == '' else number
+        showTokens = tokenize(show)
+        queryTokens = [t for t in tokenize(filename) | showTokens if t in self.index]
+
+        tokenScores = defaultdict(float)
+        total = sum(self._idf(t) for t in queryTokens) or 1.0
+        for token in queryTokens:
+            weight = self._idf(token) / total
+            for i in self.index[token]:
+                tokenScores[i] += weight
+        matches = set(tokenScores) | self.episodes.get((season, number), set())
+
+        ranked = []
+        for i in matches:
+            parsed = self.parsed[i]
+            score = self.weights['tokens'] * tokenScores.get(i, 0.0)
+            showScore = 1.0
+            if showTokens and self.showTokens[i]:
+                showScore = (len(showTokens & self.showTokens[i]) /
+                             float(len(showTokens | self.showTokens[i])))
+                score += self.weights['show'] * (2 * showScore - 1)
+            sameEpisode = True
+            for field, value in (('season', season), ('episode', number)):
+                found = getattr(parsed, field)
+                if value != '' and found != '':
+                    # a different season/episode is worse than an unknown one
+                    score += self.weights[field] if found == value else -self.weights[field]
+                    sameEpisode = sameEpisode and found == value
+            sameRelease = sameEpisode and showScore >= 0.5
+            for field in ('quality', 'source', 'group'):
+                value = getattr(target, field)
+                if value and getattr(parsed, field) == value:
+                    score += self.weights[field]
+                elif value:
+                    sameRelease = False
+            sync = sameRelease and bool(target.group or target.source)
+            ranked.append(RankedSubtitle(self.names[i], score, sync, parsed, self.data[i]))
+        ranked.sort(key=lambda r: r.score, reverse=True)
+        ranked.extend(RankedSubtitle(self.names[i], 0.0, False, self.parsed[i], self.data[i])
+                      for i in range(len(self.names)) if i not in matches)
+        return ranked
+
+
+def rankSubtitles(episode, candidates, weights=None):
+    return SubtitleRanker(candidates, weights).rank(episode)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+'''
+    cacheable keys: arguments of different types must never share a key
+    run with: python -m pytest tests (the kodi_six stand-in of the benchmarks is used)
+'''
+import os
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lib'))
+sys.path.insert(0, os.path.join(HERE, '..', 'benchmarks'))
+
+from benchutils import ReprCache  # noqa: E402
+from phate89lib import kodiutils  # noqa: E402
+from phate89lib.cacheutils import MEMCACHE  # noqa: E402
+
+
+class Api(object):
+
+    def __init__(self):
+        self.cache = ReprCache()
+        self.calls = 0
+
+    def g(self, value, page=1):
+        pass
+
+    @kodiutils.cacheable(hours=1)
+    def echo(self, value):
+        self.calls += 1
+        return repr(value)
+
+
+def key(*args, **kwargs):
+    return kodiutils.createCacheKey('test', Api.g, (Api(),) + args, kwargs)
+
+
+class CacheKeyTest(unittest.TestCase):
+
+    def test_container_types(self):
+        self.assertNotEqual(key((1, 2)), key([1, 2]))
+        self.assertNotEqual(key(set([1, 2])), key([1, 2]))
+        self.assertNotEqual(key(set([1, 2])), key(frozenset([1, 2])))
+
+    def test_dict_key_types(self):
+        self.assertNotEqual(key({1: 'a'}), key({'1': 'a'}))
+        self.assertNotEqual(key({(1, 2): 'a'}), key({'(1, 2)': 'a'}))
+
+    def test_scalar_types(self):
+        keys = [key(1), key('1'), key(1.0), key(True), key(None), key('None')]
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_same_call(self):
+        self.assertEqual(key(5), key(5, page=1))
+        self.assertEqual(key(5), key(value=5))
+        self.assertEqual(key({'a': 1, 'b': 2}), key({'b': 2, 'a': 1}))
+        self.assertEqual(key(set(['a', 'b', 'c'])), key(set(['c', 'b', 'a'])))
+        self.assertEqual(key(u'citt\xe0'), key(u'citt\xe0'))
+
+    def test_cacheable_no_wrong_hit(self):
+        MEMCACHE.clear()
+        api = Api()
+        self.assertEqual(api.echo({1: 'a'}), repr({1: 'a'}))
+        self.assertEqual(api.echo({'1': 'a'}), repr({'1': 'a'}))
+        self.assertEqual(api.echo((1, 2)), repr((1, 2)))
+        self.assertEqual(api.echo([1, 2]), repr([1, 2]))
+        self.assertEqual(api.calls, 4)
+        self.assertEqual(api.echo([1, 2]), repr([1, 2]))
+        self.assertEqual(api.calls, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()